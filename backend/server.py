@@ -1,38 +1,374 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, Form, File, UploadFile
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Form, File, UploadFile, Query, Request, Response, WebSocket
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.routing import APIRoute
+from fastapi._compat import ModelField
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.routing import Match
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne, ReturnDocument, monitoring
+from pymongo.read_preferences import SecondaryPreferred
+from bson.int64 import Int64
+import numpy as np
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
 import os
+import asyncio
 import logging
 import json
+import re
+import math
+import time
+import base64
+import hashlib
+import threading
+import contextvars
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
+from collections import OrderedDict
+from bisect import bisect_left, insort
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from zoneinfo import ZoneInfo
 import bcrypt
 import jwt
 from enum import Enum
+from abc import ABC, abstractmethod
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Metrics
+# In-process Prometheus-style metrics: per-route latency, Mongo round-trips and
+# documents per request, response serialization time and per-command Mongo latency.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+DOCUMENT_BUCKETS = (0, 1, 10, 100, 1000, 10000)
+
+METRIC_HELP = {
+    "http_requests_total": ("counter", "HTTP requests by route and status"),
+    "http_request_duration_seconds": ("histogram", "Time to response headers per route"),
+    "mongo_commands_per_request": ("histogram", "MongoDB round-trips issued while serving one request"),
+    "mongo_documents_returned_per_request": ("histogram", "Documents returned by MongoDB while serving one request"),
+    "response_serialization_seconds": ("histogram", "Response model validation, encoding and body rendering time per request"),
+    "mongo_command_duration_seconds": ("histogram", "MongoDB command latency"),
+    "mongo_command_failures_total": ("counter", "Failed MongoDB commands"),
+    "jobs_total": ("counter", "Background jobs run, by type and outcome"),
+    "job_duration_seconds": ("histogram", "Background job run time for successful runs"),
+}
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+def escape_label_value(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms: Dict[tuple, Histogram] = {}
+        self.counters: Dict[tuple, float] = {}
+
+    def observe(self, name: str, labels: Dict[str, str], value: float, buckets=LATENCY_BUCKETS):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name: str, labels: Dict[str, str], amount: float = 1):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        def label_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{name}="{escape_label_value(value)}"' for name, value in pairs) + "}"
+
+        lines = []
+        with self.lock:
+            for name, (kind, help_text) in METRIC_HELP.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                if kind == "counter":
+                    for (metric, labels), value in sorted(self.counters.items()):
+                        if metric == name:
+                            lines.append(f"{name}{label_text(labels)} {value}")
+                    continue
+                for (metric, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                    if metric != name:
+                        continue
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f"{name}_bucket{label_text(labels, [('le', bound)])} {count}")
+                    lines.append(f"{name}_bucket{label_text(labels, [('le', '+Inf')])} {histogram.count}")
+                    lines.append(f"{name}_sum{label_text(labels)} {histogram.sum}")
+                    lines.append(f"{name}_count{label_text(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+
+class RequestMetrics:
+    """Counters for the request currently being served, reached through a context var"""
+
+    def __init__(self):
+        self.mongo_commands = 0
+        self.documents_returned = 0
+        self.serialization_seconds = 0.0
+
+request_metrics: contextvars.ContextVar[Optional[RequestMetrics]] = contextvars.ContextVar("request_metrics", default=None)
+
+def documents_in_reply(reply: Dict[str, Any]) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+    if "value" in reply:
+        return int(reply["value"] is not None)
+    return 0
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Records every command; Motor runs pymongo with a copy of the caller's context,
+    so commands are attributed to the request that issued them"""
+
+    def __init__(self):
+        self.collections: Dict[int, str] = {}
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        if not isinstance(target, str):
+            target = event.command.get("collection", "")
+        with metrics.lock:
+            self.collections[event.request_id] = target
+
+    def _finish(self, event) -> Dict[str, str]:
+        with metrics.lock:
+            collection = self.collections.pop(event.request_id, "")
+        return {"command": event.command_name, "collection": collection}
+
+    def succeeded(self, event):
+        labels = self._finish(event)
+        metrics.observe("mongo_command_duration_seconds", labels, event.duration_micros / 1e6)
+        current = request_metrics.get()
+        if current is not None:
+            with metrics.lock:
+                current.mongo_commands += 1
+                current.documents_returned += documents_in_reply(event.reply)
+
+    def failed(self, event):
+        labels = self._finish(event)
+        metrics.inc("mongo_command_failures_total", labels)
+        current = request_metrics.get()
+        if current is not None:
+            with metrics.lock:
+                current.mongo_commands += 1
+
+def record_serialization(seconds: float):
+    current = request_metrics.get()
+    if current is not None:
+        current.serialization_seconds += seconds
+
+class TimedJSONResponse(JSONResponse):
+    """Default response class; its render time counts as the request's serialization"""
+
+    def render(self, content: Any) -> bytes:
+        start = time.perf_counter()
+        try:
+            return super().render(content)
+        finally:
+            record_serialization(time.perf_counter() - start)
+
+class TimedORJSONResponse(ORJSONResponse):
+    def render(self, content: Any) -> bytes:
+        start = time.perf_counter()
+        try:
+            return super().render(content)
+        finally:
+            record_serialization(time.perf_counter() - start)
+
+class TimedModelField(ModelField):
+    """Response model field whose validation and encoding count as serialization"""
+
+    def validate(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().validate(*args, **kwargs)
+        finally:
+            record_serialization(time.perf_counter() - start)
+
+    def serialize(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().serialize(*args, **kwargs)
+        finally:
+            record_serialization(time.perf_counter() - start)
+
+class TimedAPIRoute(APIRoute):
+    """Route class of api_router: hands FastAPI a timed copy of the response model field"""
+
+    def get_route_handler(self):
+        field = self.secure_cloned_response_field
+        if field is not None and not isinstance(field, TimedModelField):
+            self.secure_cloned_response_field = TimedModelField(
+                field_info=field.field_info, name=field.name, mode=field.mode)
+        return super().get_route_handler()
+
 # MongoDB connection
+# Pool, timeout and compression settings are only passed when set, so options
+# given in MONGO_URL keep working otherwise
+MONGO_CLIENT_OPTIONS = {
+    "maxPoolSize": ('MONGO_MAX_POOL_SIZE', int),
+    "minPoolSize": ('MONGO_MIN_POOL_SIZE', int),
+    "maxIdleTimeMS": ('MONGO_MAX_IDLE_TIME_MS', int),
+    "waitQueueTimeoutMS": ('MONGO_WAIT_QUEUE_TIMEOUT_MS', int),
+    "connectTimeoutMS": ('MONGO_CONNECT_TIMEOUT_MS', int),
+    "socketTimeoutMS": ('MONGO_SOCKET_TIMEOUT_MS', int),
+    "serverSelectionTimeoutMS": ('MONGO_SERVER_SELECTION_TIMEOUT_MS', int),
+    "compressors": ('MONGO_COMPRESSORS', str),
+}
+
+def mongo_client_options() -> Dict[str, Any]:
+    options = {}
+    for option, (variable, parse) in MONGO_CLIENT_OPTIONS.items():
+        value = os.environ.get(variable, '').strip()
+        if value:
+            options[option] = parse(value)
+    return options
+
+# Public list endpoints may read from secondaries, at most this far behind the
+# primary; everything else uses db. For the same length of time after this process
+# writes to a namespace, its reads go to the primary, so neither the writer nor this
+# process's response cache is served a secondary that predates the write.
+MONGO_SECONDARY_READS = os.environ.get('MONGO_SECONDARY_READS', 'true').lower() == 'true'
+MONGO_READ_MAX_STALENESS_SECONDS = int(os.environ.get('MONGO_READ_MAX_STALENESS_SECONDS', '90'))
+if MONGO_SECONDARY_READS and MONGO_READ_MAX_STALENESS_SECONDS < 90:
+    raise ValueError("MONGO_READ_MAX_STALENESS_SECONDS must be at least 90, the smallest bound MongoDB accepts")
+
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandMetrics()], **mongo_client_options())
 db = client[os.environ['DB_NAME']]
+if MONGO_SECONDARY_READS:
+    db_reads = client.get_database(
+        os.environ['DB_NAME'],
+        read_preference=SecondaryPreferred(max_staleness=MONGO_READ_MAX_STALENESS_SECONDS)
+    )
+else:
+    db_reads = db
 
 # Create the main app without a prefix
-app = FastAPI(title="M2DG Basketball Platform API", version="1.0.0")
+app = FastAPI(title="M2DG Basketball Platform API", version="1.0.0", default_response_class=TimedJSONResponse)
 
 # Create a router with the /api prefix
-api_router = APIRouter(prefix="/api")
+api_router = APIRouter(prefix="/api", route_class=TimedAPIRoute)
 
 # Security
 security = HTTPBearer(auto_error=False)
 JWT_SECRET = "your-secret-key-here"  # In production, use environment variable
 JWT_ALGORITHM = "HS256"
+ADMIN_EMAILS = {email.strip().lower() for email in os.environ.get('ADMIN_EMAILS', '').split(',') if email.strip()}
+# Court gate readers present one of these keys in X-Gate-Key; check-in is disabled
+# until at least one is configured
+CHECKIN_GATE_KEYS = {key.strip() for key in os.environ.get('CHECKIN_GATE_KEYS', '').split(',') if key.strip()}
+
+# Password hashing runs on a dedicated thread pool (bcrypt releases the GIL),
+# so logins scale with cores instead of blocking the event loop.
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', str(os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', str(PASSWORD_HASH_WORKERS * 8)))
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+password_jobs_pending = 0
+
+# Authenticated principals are cached per process so hot routes skip the users lookup
+USER_CACHE_TTL_SECONDS = float(os.environ.get('USER_CACHE_TTL_SECONDS', '60'))
+USER_CACHE_MAX_SIZE = int(os.environ.get('USER_CACHE_MAX_SIZE', '10000'))
+
+# List endpoints are paginated with an opaque keyset cursor on (created_at, id),
+# returned in X-Next-Cursor; the default page matches the old 1000-row list cap
+DEFAULT_PAGE_SIZE = int(os.environ.get('DEFAULT_PAGE_SIZE', '1000'))
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', '1000'))
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '500'))
+
+# Leaderboard boards are materialized in Mongo and mirrored in memory for rank lookups
+LEADERBOARD_CACHE_BOARDS = int(os.environ.get('LEADERBOARD_CACHE_BOARDS', '256'))
+LEADERBOARD_REFRESH_SECONDS = float(os.environ.get('LEADERBOARD_REFRESH_SECONDS', '30'))
+
+# Public read endpoints are served from a response cache, invalidated on writes
+RESPONSE_CACHE_TTL_SECONDS = float(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', '30'))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '1000'))
+
+# Live scoring batches applied per request by /api/games/score-events
+SCORE_EVENTS_MAX_BATCH = int(os.environ.get('SCORE_EVENTS_MAX_BATCH', '5000'))
+# Each game remembers the ids of its most recent events so redelivered ones are skipped
+SCORE_EVENT_DEDUP_WINDOW = int(os.environ.get('SCORE_EVENT_DEDUP_WINDOW', '1000'))
+PLAY_EVENTS_MAX_BATCH = int(os.environ.get('PLAY_EVENTS_MAX_BATCH', '500'))
+# Games and box score rows remember their most recent play batch ids so retries are skipped
+PLAY_BATCH_DEDUP_WINDOW = int(os.environ.get('PLAY_BATCH_DEDUP_WINDOW', '200'))
+
+# Season/career rollups are folded in from games completed since the last run;
+# the lag leaves room for completions still being written
+STAT_ROLLUP_INTERVAL_SECONDS = float(os.environ.get('STAT_ROLLUP_INTERVAL_SECONDS', '300'))
+STAT_ROLLUP_LAG_SECONDS = float(os.environ.get('STAT_ROLLUP_LAG_SECONDS', '5'))
+
+# Live score fan-out: updates inside the coalescing window are merged per game
+LIVE_SCORE_COALESCE_SECONDS = float(os.environ.get('LIVE_SCORE_COALESCE_SECONDS', '0.1'))
+LIVE_SCORE_SEND_TIMEOUT_SECONDS = float(os.environ.get('LIVE_SCORE_SEND_TIMEOUT_SECONDS', '5'))
+
+# Elo ratings, updated live on game completion and recomputable from full history
+RATING_INITIAL = float(os.environ.get('RATING_INITIAL', '1500'))
+RATING_K_FACTOR = float(os.environ.get('RATING_K_FACTOR', '32'))
+RATING_SCALE = float(os.environ.get('RATING_SCALE', '400'))
+RATING_RECOMPUTE_CHUNK = int(os.environ.get('RATING_RECOMPUTE_CHUNK', '10000'))
+
+# Matchmaking buckets open challenges by creator rating and scheduled time
+MATCHMAKING_RATING_BUCKET = float(os.environ.get('MATCHMAKING_RATING_BUCKET', '100'))
+MATCHMAKING_WINDOW_HOURS = float(os.environ.get('MATCHMAKING_WINDOW_HOURS', '6'))
+MATCHMAKING_MAX_RINGS = int(os.environ.get('MATCHMAKING_MAX_RINGS', '8'))
+# The index is rebuilt this often to pick up challenges created elsewhere (0 disables)
+MATCHMAKING_RELOAD_SECONDS = float(os.environ.get('MATCHMAKING_RELOAD_SECONDS', '60'))
+
+# Search: prefix terms expanded per query word for autocomplete, and how often the
+# index is rebuilt to pick up writes made by other processes (0 disables)
+SEARCH_MAX_PREFIX_TERMS = int(os.environ.get('SEARCH_MAX_PREFIX_TERMS', '50'))
+SEARCH_RELOAD_SECONDS = float(os.environ.get('SEARCH_RELOAD_SECONDS', '300'))
+
+# Background jobs: side effects are queued in the jobs collection and run by worker
+# loops, in this process unless JOB_WORKER_IN_PROCESS is off (see worker.py)
+JOB_WORKER_IN_PROCESS = os.environ.get('JOB_WORKER_IN_PROCESS', 'true').lower() == 'true'
+JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS', '1'))
+JOB_LEASE_SECONDS = float(os.environ.get('JOB_LEASE_SECONDS', '300'))
+JOB_LEASE_SWEEP_SECONDS = float(os.environ.get('JOB_LEASE_SWEEP_SECONDS', '30'))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '5'))
+JOB_RETRY_BASE_SECONDS = float(os.environ.get('JOB_RETRY_BASE_SECONDS', '2'))
+JOB_RETRY_MAX_SECONDS = float(os.environ.get('JOB_RETRY_MAX_SECONDS', '600'))
+JOB_RETENTION_SECONDS = int(os.environ.get('JOB_RETENTION_SECONDS', str(7 * 24 * 3600)))
+
+# Gate check-in accepts a booking's RFID code from this long before it starts until
+# it ends; booking times are wall-clock times in CHECKIN_TIMEZONE
+CHECKIN_EARLY_MINUTES = int(os.environ.get('CHECKIN_EARLY_MINUTES', '15'))
+CHECKIN_TIMEZONE = ZoneInfo(os.environ.get('CHECKIN_TIMEZONE', 'UTC'))
+
+# Court time is reserved in fixed slots; a booking claims every slot it touches
+BOOKING_SLOT_MINUTES = 15
+# Daily occupancy bitmaps split the day's slots across two 48-bit words (am/pm)
+SLOTS_PER_DAY = 24 * 60 // BOOKING_SLOT_MINUTES
+SLOTS_PER_WORD = SLOTS_PER_DAY // 2
+AVAILABILITY_MAX_DAYS = int(os.environ.get('AVAILABILITY_MAX_DAYS', '31'))
 
 # Enums
 class BookingStatus(str, Enum):
@@ -47,6 +383,11 @@ class TournamentStatus(str, Enum):
     COMPLETED = "completed"
     CANCELLED = "cancelled"
 
+class TournamentFormat(str, Enum):
+    SINGLE_ELIMINATION = "single_elimination"
+    DOUBLE_ELIMINATION = "double_elimination"
+    ROUND_ROBIN = "round_robin"
+
 class ChallengeStatus(str, Enum):
     OPEN = "open"
     ACCEPTED = "accepted"
@@ -59,6 +400,16 @@ class GameResult(str, Enum):
     LOSS = "loss"
     DRAW = "draw"
 
+class PlayType(str, Enum):
+    SHOT = "shot"
+    REBOUND = "rebound"
+    ASSIST = "assist"
+    FOUL = "foul"
+    STEAL = "steal"
+    BLOCK = "block"
+    TURNOVER = "turnover"
+    SUBSTITUTION = "substitution"
+
 # Pydantic Models
 class User(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -107,10 +458,15 @@ class UserResponse(BaseModel):
     is_coach: bool = False
     created_at: datetime
 
+class GeoPoint(BaseModel):
+    type: str = "Point"
+    coordinates: List[float]  # GeoJSON order: [longitude, latitude]
+
 class Court(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
     location: str
+    coordinates: Optional[GeoPoint] = None
     description: Optional[str] = None
     court_type: str  # indoor, outdoor
     surface_type: str  # hardwood, concrete, etc.
@@ -124,6 +480,8 @@ class Court(BaseModel):
 class CourtCreate(BaseModel):
     name: str
     location: str
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
     description: Optional[str] = None
     court_type: str
     surface_type: str
@@ -132,6 +490,9 @@ class CourtCreate(BaseModel):
     capacity: int
     images: List[str] = []
 
+class NearbyCourt(Court):
+    distance_km: float
+
 class Booking(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
@@ -143,9 +504,13 @@ class Booking(BaseModel):
     total_cost: float
     status: BookingStatus = BookingStatus.PENDING
     rfid_code: str = Field(default_factory=lambda: str(uuid.uuid4())[:8].upper())
+    checked_in_at: Optional[datetime] = None
     special_requests: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+class CheckInRequest(BaseModel):
+    rfid_code: str
+
 class BookingCreate(BaseModel):
     court_id: str
     date: str  # YYYY-MM-DD format
@@ -153,6 +518,21 @@ class BookingCreate(BaseModel):
     duration_hours: int
     special_requests: Optional[str] = None
 
+class BracketMatch(BaseModel):
+    stage: str  # winners, losers, final or round_robin
+    round: int
+    slots: List[Optional[str]] = Field(default_factory=lambda: [None, None])  # participant id, "BYE" or None while pending
+    winner: Optional[str] = None
+    game_id: Optional[str] = None
+    winner_to: Optional[List[int]] = None  # [match index, slot] the winner moves to
+    loser_to: Optional[List[int]] = None  # [match index, slot] the loser drops to
+
+class Bracket(BaseModel):
+    format: TournamentFormat
+    seeds: List[str]
+    matches: List[BracketMatch]
+    champion: Optional[str] = None
+
 class Tournament(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
@@ -165,7 +545,8 @@ class Tournament(BaseModel):
     prize_pool: float
     rules: List[str] = Field(default_factory=list)
     status: TournamentStatus = TournamentStatus.UPCOMING
-    bracket: Optional[Dict[str, Any]] = None
+    format: TournamentFormat = TournamentFormat.SINGLE_ELIMINATION
+    bracket: Optional[Bracket] = None
     participants: List[str] = Field(default_factory=list)
     created_by: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -179,6 +560,10 @@ class TournamentCreate(BaseModel):
     max_participants: int
     prize_pool: float
     rules: List[str] = []
+    format: TournamentFormat = TournamentFormat.SINGLE_ELIMINATION
+
+class TournamentStatusUpdate(BaseModel):
+    status: TournamentStatus
 
 class Challenge(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -194,6 +579,11 @@ class Challenge(BaseModel):
     score: Optional[Dict[str, int]] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+class ChallengeMatch(BaseModel):
+    challenge: Challenge
+    creator_rating: float
+    match_score: float  # lower is a closer match
+
 class ChallengeCreate(BaseModel):
     title: str
     description: Optional[str] = None
@@ -202,6 +592,9 @@ class ChallengeCreate(BaseModel):
     scheduled_date: Optional[str] = None  # ISO format
     wager_amount: Optional[float] = None
 
+def new_referral_code() -> str:
+    return str(uuid.uuid4())[:6].upper()
+
 class Team(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
@@ -212,7 +605,7 @@ class Team(BaseModel):
     team_logo: Optional[str] = None
     stats: Dict[str, Any] = Field(default_factory=dict)
     achievements: List[str] = Field(default_factory=list)
-    referral_code: str = Field(default_factory=lambda: str(uuid.uuid4())[:6].upper())
+    referral_code: str = Field(default_factory=new_referral_code)
     is_active: bool = True
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -258,18 +651,103 @@ class Game(BaseModel):
     actual_end_time: Optional[datetime] = None
     score: Dict[str, int] = Field(default_factory=dict)
     winner: Optional[str] = None
+    bracket_match: Optional[int] = None  # index into the tournament bracket's matches
     game_type: str  # 1v1, 2v2, 5v5, etc.
     status: str = "scheduled"  # scheduled, in_progress, completed, cancelled
     stats: Dict[str, Any] = Field(default_factory=dict)
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+class ScoreEvent(BaseModel):
+    event_id: str
+    game_id: str
+    player_id: str  # score key: participant id, or positional key such as "player1"
+    points: int = 0
+    stats: Dict[str, int] = Field(default_factory=dict)  # e.g. {"rebounds": 1, "assists": 1}
+
+class ScoreEventBatch(BaseModel):
+    events: List[ScoreEvent]
+
+class PlayEvent(BaseModel):
+    type: PlayType
+    player_id: str
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    points: Optional[int] = Field(None, ge=1, le=3)  # shots: 1 for free throws, 2 or 3 from the field
+    made: Optional[bool] = None  # shots only
+    offensive: Optional[bool] = None  # rebounds only
+    related_player_id: Optional[str] = None  # player leaving on a substitution
+
+class Play(PlayEvent):
+    game_id: str
+    seq: int
+
+class PlayBatch(BaseModel):
+    batch_id: str = Field(default_factory=lambda: str(uuid.uuid4()))  # resend the same id to retry a batch
+    events: List[PlayEvent]
+
 # Helper Functions
+class TTLCache:
+    """In-process LRU cache whose entries expire after a fixed time-to-live"""
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any):
+        if self.max_size <= 0 or self.ttl_seconds <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: str):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+user_cache = TTLCache(USER_CACHE_MAX_SIZE, USER_CACHE_TTL_SECONDS)
+
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
 
 def verify_password(password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
 
+async def run_password_job(func, *args):
+    """Run a bcrypt call on the password pool, shedding load with a 503 once the queue is full"""
+    global password_jobs_pending
+    if password_jobs_pending >= PASSWORD_HASH_MAX_PENDING:
+        raise HTTPException(
+            status_code=503,
+            detail="Authentication service is busy, please retry",
+            headers={"Retry-After": "1"}
+        )
+    password_jobs_pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(password_executor, func, *args)
+    finally:
+        password_jobs_pending -= 1
+
+async def hash_password_async(password: str) -> str:
+    return await run_password_job(hash_password, password)
+
+async def verify_password_async(password: str, hashed_password: str) -> bool:
+    return await run_password_job(verify_password, password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -288,15 +766,1729 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         user_id: str = payload.get("sub")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid authentication credentials")
-        user = await db.users.find_one({"id": user_id})
+        user = user_cache.get(user_id)
         if user is None:
-            raise HTTPException(status_code=401, detail="User not found")
-        return User(**user)
+            user_doc = await db.users.find_one({"id": user_id})
+            if user_doc is None:
+                raise HTTPException(status_code=401, detail="User not found")
+            user = User(**user_doc)
+            user_cache.set(user_id, user)
+        return user
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
     except Exception:
         raise HTTPException(status_code=401, detail="Could not validate credentials")
 
+async def get_optional_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Optional[User]:
+    """The caller when a bearer token is sent, None for anonymous requests"""
+    if credentials is None:
+        return None
+    return await get_current_user(credentials)
+
+async def get_admin_user(current_user: User = Depends(get_current_user)):
+    if current_user.email.lower() not in ADMIN_EMAILS:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
+
+# Database Indexes
+# Every index the API relies on, together with the queries it serves. Indexes are
+# ensured idempotently at startup and reported by /api/admin/indexes.
+INDEX_REGISTRY: List[Dict[str, Any]] = [
+    {"collection": "users", "keys": [("email", 1)], "options": {"unique": True},
+     "queries": ["register/login: find_one({email})"]},
+    {"collection": "users", "keys": [("id", 1)], "options": {"unique": True},
+     "queries": ["get_current_user, update_user_profile: find_one({id})"]},
+    {"collection": "courts", "keys": [("id", 1)], "options": {"unique": True},
+     "queries": ["get_court, create_booking: find_one({id})"]},
+    {"collection": "courts", "keys": [("coordinates", "2dsphere")],
+     "queries": ["get_nearby_courts: $geoNear"]},
+    {"collection": "courts", "keys": [("created_at", 1), ("id", 1)],
+     "queries": ["get_courts: keyset page"]},
+    {"collection": "bookings", "keys": [("id", 1)], "options": {"unique": True},
+     "queries": ["find_one({id})"]},
+    {"collection": "bookings", "keys": [("user_id", 1), ("created_at", 1), ("id", 1)],
+     "queries": ["get_my_bookings: keyset page on find({user_id})"]},
+    {"collection": "bookings", "keys": [("court_id", 1), ("rfid_code", 1)],
+     "queries": ["check_in: fallback find_one({court_id, rfid_code})"]},
+    {"collection": "bookings", "keys": [("end_time", 1)],
+     "queries": ["load_check_in_index: find({end_time > day start, start_time < day end})"]},
+    {"collection": "bookings", "keys": [("court_id", 1), ("end_time", 1), ("start_time", 1)],
+     "queries": ["create_booking: overlap check {court_id, end_time > start, start_time < end}"]},
+    {"collection": "court_slots", "keys": [("court_id", 1), ("slot_start", 1)], "options": {"unique": True},
+     "queries": ["reserve_court_slots: atomic slot claim"]},
+    {"collection": "court_slots", "keys": [("booking_id", 1)],
+     "queries": ["release_court_slots: delete_many({booking_id})"]},
+    {"collection": "court_occupancy", "keys": [("day", 1), ("court_id", 1)], "options": {"unique": True},
+     "queries": ["get_court_availability: find({day range})", "mark_court_occupancy: upsert per court/day"]},
+    {"collection": "tournaments", "keys": [("id", 1)], "options": {"unique": True},
+     "queries": ["register_for_tournament: find_one({id})"]},
+    {"collection": "tournaments", "keys": [("created_at", 1), ("id", 1)],
+     "queries": ["get_tournaments: keyset page"]},
+    {"collection": "challenges", "keys": [("id", 1)], "options": {"unique": True},
+     "queries": ["accept_challenge: find_one({id})"]},
+    {"collection": "challenges", "keys": [("created_at", 1), ("id", 1)],
+     "queries": ["get_challenges: keyset page"]},
+    {"collection": "challenges", "keys": [("status", 1)],
+     "queries": ["load_matchmaking_index: find({status: open, scheduled_date unset or upcoming})"]},
+    {"collection": "teams", "keys": [("id", 1)], "options": {"unique": True},
+     "queries": ["join_team: find_one({id})"]},
+    {"collection": "teams", "keys": [("created_at", 1), ("id", 1)],
+     "queries": ["get_teams: keyset page"]},
+    {"collection": "teams", "keys": [("referral_code", 1)], "options": {"unique": True},
+     "queries": ["join_team_by_code: find_one({referral_code})"]},
+    {"collection": "coaches", "keys": [("id", 1)], "options": {"unique": True},
+     "queries": ["find_one({id})"]},
+    {"collection": "coaches", "keys": [("created_at", 1), ("id", 1)],
+     "queries": ["get_coaches: keyset page"]},
+    {"collection": "coaches", "keys": [("user_id", 1)], "options": {"unique": True},
+     "queries": ["create_coach_profile: find_one({user_id})"]},
+    {"collection": "plays", "keys": [("g", 1), ("s", 1)], "options": {"unique": True},
+     "queries": ["append_plays: insert_many", "stream_game_plays: find({g, s > after}).sort(s)"]},
+    {"collection": "box_scores", "keys": [("game_id", 1), ("player_id", 1)], "options": {"unique": True},
+     "queries": ["append_plays: upsert per player", "get_box_score: find({game_id})"]},
+    {"collection": "stat_rollups", "keys": [("subject_type", 1), ("subject_id", 1), ("period", 1)],
+     "options": {"unique": True},
+     "queries": ["run_stat_rollups: $merge on (subject_type, subject_id, period)", "get_stat_rollups: find({subject_type, subject_id})"]},
+    {"collection": "jobs", "keys": [("type", 1), ("status", 1), ("run_at", 1)],
+     "queries": ["claim_job: find_one_and_update({type, status: pending, run_at <= now}).sort(run_at)"]},
+    {"collection": "jobs", "keys": [("type", 1), ("status", 1), ("locked_until", 1)],
+     "queries": ["claim_job: reclaim {type, status: running, locked_until < now}"]},
+    {"collection": "jobs", "keys": [("finished_at", 1)], "options": {"expireAfterSeconds": JOB_RETENTION_SECONDS},
+     "queries": ["TTL: completed jobs expire after JOB_RETENTION_SECONDS"]},
+    {"collection": "games", "keys": [("id", 1)], "options": {"unique": True},
+     "queries": ["update_game_score: find_one({id})"]},
+    {"collection": "games", "keys": [("player1_id", 1), ("created_at", 1), ("id", 1)],
+     "queries": ["get_my_games: keyset page on $or branch {player1_id}"]},
+    {"collection": "games", "keys": [("player2_id", 1), ("created_at", 1), ("id", 1)],
+     "queries": ["get_my_games: keyset page on $or branch {player2_id}"]},
+    {"collection": "games", "keys": [("status", 1), ("actual_end_time", 1), ("id", 1)],
+     "queries": ["recompute_ratings: find({status: completed}).sort(actual_end_time, id)"]},
+    {"collection": "games", "keys": [("court_id", 1), ("status", 1)],
+     "queries": ["live_court_scores: find({court_id, status: in_progress})"]},
+    {"collection": "leaderboard", "keys": [("scope", 1), ("window", 1), ("subject_type", 1), ("subject_id", 1)],
+     "options": {"unique": True},
+     "queries": ["record_game_result: upsert per subject", "load_leaderboard_board: find({scope, window, subject_type})"]},
+]
+
+def index_key_signature(keys) -> List[List[Any]]:
+    return [[field, direction] for field, direction in keys]
+
+async def ensure_indexes():
+    """Create every registered index; existing identical indexes are left untouched"""
+    for spec in INDEX_REGISTRY:
+        try:
+            await db[spec["collection"]].create_index(spec["keys"], **spec.get("options", {}))
+        except PyMongoError as e:
+            logger.error(f"Could not ensure index {spec['collection']} {spec['keys']}: {e}")
+
+# Pagination
+def encode_cursor(doc: Dict[str, Any]) -> str:
+    payload = json.dumps({"created_at": doc["created_at"].isoformat(), "id": doc["id"]})
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('utf-8')
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('utf-8')))
+        return {"created_at": datetime.fromisoformat(payload["created_at"]), "id": str(payload["id"])}
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+def parse_fields(fields: Optional[str], model) -> Optional[Dict[str, int]]:
+    """Turn a comma-separated ?fields= list into a Mongo projection (id and created_at are always kept)"""
+    if not fields:
+        return None
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in model.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    projection = {"_id": 0, "id": 1, "created_at": 1}
+    projection.update({field: 1 for field in requested})
+    return projection
+
+async def fetch_page(collection, query: Dict[str, Any], limit: int, after: Optional[str] = None,
+                     projection: Optional[Dict[str, int]] = None):
+    """Fetch one keyset page ordered by (created_at, id); returns the documents and the next cursor"""
+    if after:
+        position = decode_cursor(after)
+        query = {"$and": [query, {"$or": [
+            {"created_at": {"$gt": position["created_at"]}},
+            {"created_at": position["created_at"], "id": {"$gt": position["id"]}}
+        ]}]}
+    docs = await collection.find(query, projection or {"_id": 0}).sort([("created_at", 1), ("id", 1)]).to_list(limit + 1)
+    next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+    return docs[:limit], next_cursor
+
+model_shapes: Dict[type, List[Tuple[str, Any, Any, bool]]] = {}
+
+def trusted_documents(model, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Shape documents this API wrote itself to `model` without revalidating them,
+    as model_construct would: defaults fill fields added later, unknown keys drop"""
+    shape = model_shapes.get(model)
+    if shape is None:
+        shape = model_shapes[model] = [
+            (name, field.default, field.default_factory, field.is_required())
+            for name, field in model.model_fields.items()
+        ]
+    return [
+        {name: doc[name] if name in doc else (factory() if factory else default)
+         for name, default, factory, required in shape if name in doc or not required}
+        for doc in docs
+    ]
+
+def fast_json_response(content: Any, headers: Optional[Dict[str, str]] = None) -> ORJSONResponse:
+    """Render with orjson; returning a Response also skips FastAPI's response_model pass"""
+    return TimedORJSONResponse(content, headers=headers)
+
+def page_response(model, docs: List[Dict[str, Any]], next_cursor: Optional[str],
+                  projection: Optional[Dict[str, int]]):
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    if projection is not None:
+        # Partial documents cannot satisfy the full response model, so return them as-is
+        return fast_json_response(docs, headers)
+    return fast_json_response(trusted_documents(model, docs), headers)
+
+# Streaming
+def json_default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+async def ndjson_lines(cursor, convert=None):
+    """Yield one JSON document per line straight off a Motor cursor"""
+    async for doc in cursor:
+        yield json.dumps(convert(doc) if convert else doc, default=json_default) + "\n"
+
+# Play-by-Play
+# Plays are stored append-only under short field names, numbered per game by a
+# counter on the game document; box_scores holds one running row per player.
+# Each batch is listed on the game (id and size, newest last) and on every box
+# score row it touched, so a retried batch reuses its seqs and is rolled up once.
+PLAY_FIELDS = {
+    "game_id": "g", "seq": "s", "type": "t", "player_id": "p", "timestamp": "ts",
+    "points": "v", "made": "m", "offensive": "o", "related_player_id": "r",
+}
+PLAY_FIELD_NAMES = {short: name for name, short in PLAY_FIELDS.items()}
+
+def compact_play(play: Play) -> Dict[str, Any]:
+    return {PLAY_FIELDS[name]: value for name, value in play.dict().items() if value is not None}
+
+def expand_play(doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {PLAY_FIELD_NAMES[short]: value for short, value in doc.items() if short in PLAY_FIELD_NAMES}
+
+def batch_seq_range(game: Dict[str, Any], batch_id: str) -> Optional[Tuple[int, int]]:
+    """Seqs reserved by a batch still listed on the game; batches after it account
+    for the rest of play_count"""
+    last_seq = game["play_count"]
+    for entry in reversed(game.get("play_batches", [])):
+        if entry["id"] == batch_id:
+            return last_seq - entry["size"] + 1, last_seq
+        last_seq -= entry["size"]
+    return None
+
+def box_score_increments(play: PlayEvent) -> Dict[str, int]:
+    """Counting stats one play adds to its player's box score row"""
+    if play.type == PlayType.SHOT:
+        points = play.points or 2
+        attempt, make = {1: ("fta", "ftm"), 2: ("fga", "fgm"), 3: ("fg3a", "fg3m")}[points]
+        increments = {attempt: 1}
+        if points == 3:
+            increments["fga"] = 1
+        if play.made:
+            increments.update({make: 1, "pts": points})
+            if points == 3:
+                increments["fgm"] = 1
+        return increments
+    if play.type == PlayType.REBOUND:
+        return {"reb": 1, "oreb" if play.offensive else "dreb": 1}
+    if play.type == PlayType.SUBSTITUTION:
+        return {"subs_in": 1}
+    return {{PlayType.ASSIST: "ast", PlayType.FOUL: "pf", PlayType.STEAL: "stl",
+             PlayType.BLOCK: "blk", PlayType.TURNOVER: "tov"}[play.type]: 1}
+
+def shooting_splits(row: Dict[str, Any]) -> Dict[str, Optional[float]]:
+    return {
+        f"{label}_pct": round(row.get(made, 0) / row[attempted], 3) if row.get(attempted) else None
+        for label, made, attempted in (("fg", "fgm", "fga"), ("fg3", "fg3m", "fg3a"), ("ft", "ftm", "fta"))
+    }
+
+# Stat Rollups
+# stat_rollups holds one document per (subject_type, subject_id, period), where
+# period is "career", "season:YYYY" or "day:YYYY-MM-DD". Each run aggregates only
+# the games completed inside a window claimed from the watermark in
+# pipeline_state and $merges the sums into the existing documents. A window is
+# identified by its upper bound, stamped as updated_at on every document it touches,
+# so re-running a failed window skips documents it already added to.
+STAT_ROLLUP_COUNTERS = ["games", "wins", "losses", "draws", "points_for", "points_against"]
+
+def side_points_expression(side: str):
+    """Mongo expression mirroring game_side_points: score keyed by id, else by side"""
+    def score_for(key):
+        return {"$arrayElemAt": [{"$map": {
+            "input": {"$filter": {"input": {"$objectToArray": {"$ifNull": ["$score", {}]}},
+                                  "cond": {"$eq": ["$$this.k", key]}}},
+            "in": "$$this.v"
+        }}, 0]}
+    return {"$ifNull": [score_for(f"${side}_id"), {"$ifNull": [score_for(side), 0]}]}
+
+def stat_rollup_pipeline(window: Dict[str, Any], updated_at: datetime) -> List[Dict[str, Any]]:
+    sides = []
+    for subject_type, (first, second) in (("player", ("player1", "player2")), ("team", ("team1", "team2"))):
+        for side, opponent in ((first, second), (second, first)):
+            sides.append({
+                "subject_type": subject_type,
+                "subject_id": f"${side}_id",
+                "opponent_id": f"${opponent}_id",
+                "points_for": side_points_expression(side),
+                "points_against": side_points_expression(opponent)
+            })
+    has_winner = {"$ne": [{"$ifNull": ["$winner", None]}, None]}
+    outcome = {"$switch": {"branches": [
+        {"case": {"$and": [has_winner, {"$eq": ["$winner", "$side.subject_id"]}]}, "then": "wins"},
+        {"case": {"$and": [has_winner, {"$eq": ["$winner", "$side.opponent_id"]}]}, "then": "losses"},
+        {"case": {"$gt": ["$side.points_for", "$side.points_against"]}, "then": "wins"},
+        {"case": {"$lt": ["$side.points_for", "$side.points_against"]}, "then": "losses"},
+    ], "default": "draws"}}
+    completed_at = {"$ifNull": ["$actual_end_time", "$created_at"]}
+    return [
+        {"$match": {"status": "completed", **window}},
+        {"$project": {"_id": 0, "winner": 1, "completed_at": completed_at, "side": sides}},
+        {"$unwind": "$side"},
+        {"$match": {"side.subject_id": {"$ne": None}}},
+        {"$addFields": {"outcome": outcome, "period": [
+            "career",
+            {"$concat": ["season:", {"$dateToString": {"format": "%Y", "date": "$completed_at"}}]},
+            {"$concat": ["day:", {"$dateToString": {"format": "%Y-%m-%d", "date": "$completed_at"}}]},
+        ]}},
+        {"$unwind": "$period"},
+        {"$group": {
+            "_id": {"subject_type": "$side.subject_type", "subject_id": "$side.subject_id", "period": "$period"},
+            "games": {"$sum": 1},
+            "wins": {"$sum": {"$cond": [{"$eq": ["$outcome", "wins"]}, 1, 0]}},
+            "losses": {"$sum": {"$cond": [{"$eq": ["$outcome", "losses"]}, 1, 0]}},
+            "draws": {"$sum": {"$cond": [{"$eq": ["$outcome", "draws"]}, 1, 0]}},
+            "points_for": {"$sum": "$side.points_for"},
+            "points_against": {"$sum": "$side.points_against"},
+        }},
+        {"$project": {
+            "_id": 0,
+            "subject_type": "$_id.subject_type",
+            "subject_id": "$_id.subject_id",
+            "period": "$_id.period",
+            **{counter: 1 for counter in STAT_ROLLUP_COUNTERS},
+            "updated_at": {"$literal": updated_at}
+        }},
+        {"$merge": {
+            "into": "stat_rollups",
+            "on": ["subject_type", "subject_id", "period"],
+            "whenMatched": [{"$set": {
+                **{counter: {"$cond": [
+                    {"$eq": ["$updated_at", "$$new.updated_at"]},
+                    f"${counter}",
+                    {"$add": [f"${counter}", f"$$new.{counter}"]}
+                ]} for counter in STAT_ROLLUP_COUNTERS},
+                "updated_at": "$$new.updated_at"
+            }}],
+            "whenNotMatched": "insert"
+        }}
+    ]
+
+def career_stats_pipeline(subject_type: str, target: str, updated_at: datetime) -> List[Dict[str, Any]]:
+    """Copy refreshed career rollups into User.stats / Team.stats for profile reads"""
+    return [
+        {"$match": {"subject_type": subject_type, "period": "career", "updated_at": updated_at}},
+        {"$project": {"_id": 0, "id": "$subject_id",
+                      "career": {counter: f"${counter}" for counter in STAT_ROLLUP_COUNTERS}}},
+        {"$merge": {
+            "into": target,
+            "on": "id",
+            "whenMatched": [{"$set": {"stats.career": "$$new.career"}}],
+            "whenNotMatched": "discard"
+        }}
+    ]
+
+async def run_stat_rollups() -> Optional[Dict[str, Any]]:
+    """Fold newly completed games into stat_rollups; returns the window processed, or
+    None when another process claimed it first"""
+    state = await db.pipeline_state.find_one({"_id": "stat_rollups"}) or {}
+    watermark = state.get("watermark")
+    # A failed window is retried with the same bounds so it stays recognisable
+    upper = state.get("retry_to")
+    if upper is None:
+        upper = datetime.utcnow() - timedelta(seconds=STAT_ROLLUP_LAG_SECONDS)
+        # Mongo keeps milliseconds; the watermark is matched by equality later on
+        upper = upper.replace(microsecond=upper.microsecond // 1000 * 1000)
+        if watermark is not None and upper <= watermark:
+            return {"from": watermark, "to": watermark}
+    
+    # Advancing the watermark with compare-and-set claims the window, so concurrent
+    # runs in other processes never aggregate the same games twice
+    try:
+        claimed = await db.pipeline_state.find_one_and_update(
+            {"_id": "stat_rollups", "watermark": watermark},
+            {"$set": {"watermark": upper}, "$unset": {"retry_to": ""}},
+            upsert=watermark is None
+        )
+    except DuplicateKeyError:
+        return None
+    if claimed is None and watermark is not None:
+        return None
+    
+    if watermark is None:
+        # First run: also take games completed before actual_end_time was recorded
+        window = {"$or": [{"actual_end_time": {"$lte": upper}}, {"actual_end_time": None}]}
+    else:
+        window = {"actual_end_time": {"$gt": watermark, "$lte": upper}}
+    try:
+        await db.games.aggregate(stat_rollup_pipeline(window, upper)).to_list(None)
+        await db.stat_rollups.aggregate(career_stats_pipeline("player", "users", upper)).to_list(None)
+        await db.stat_rollups.aggregate(career_stats_pipeline("team", "teams", upper)).to_list(None)
+    except PyMongoError:
+        # Hand the window back so the next run retries it; documents the failed run
+        # already added to carry its updated_at and are left as they are
+        await db.pipeline_state.update_one({"_id": "stat_rollups", "watermark": upper},
+                                           {"$set": {"watermark": watermark, "retry_to": upper}})
+        raise
+    user_cache.clear()
+    return {"from": watermark, "to": upper}
+
+async def stat_rollup_loop():
+    while True:
+        await asyncio.sleep(STAT_ROLLUP_INTERVAL_SECONDS)
+        try:
+            await run_stat_rollups()
+        except PyMongoError as e:
+            logger.error(f"Stat rollup run failed: {e}")
+
+# Leaderboard
+# A board is one (scope, window, subject_type) slice of the materialized leaderboard
+# collection: scope is "global" or "court:<id>", window is "all", "month:YYYY-MM" or
+# "week:YYYY-Www". Completed games are folded in with $inc as they finish.
+class LeaderboardIndex:
+    """Sorted in-memory view of one board, best first, for O(log n) rank lookups"""
+
+    def __init__(self, entries: List[Dict[str, Any]]):
+        self.entries = {entry["subject_id"]: entry for entry in entries}
+        self.keys = sorted(self.sort_key(entry) for entry in entries)
+
+    @staticmethod
+    def sort_key(entry: Dict[str, Any]):
+        return (-entry.get("wins", 0), -entry.get("points", 0), entry["subject_id"])
+
+    def __len__(self):
+        return len(self.keys)
+
+    def upsert(self, entry: Dict[str, Any]):
+        existing = self.entries.get(entry["subject_id"])
+        if existing is not None:
+            del self.keys[bisect_left(self.keys, self.sort_key(existing))]
+        self.entries[entry["subject_id"]] = entry
+        insort(self.keys, self.sort_key(entry))
+
+    def rank(self, subject_id: str) -> Optional[int]:
+        entry = self.entries.get(subject_id)
+        if entry is None:
+            return None
+        return bisect_left(self.keys, self.sort_key(entry)) + 1
+
+    def page(self, offset: int, limit: int) -> List[Dict[str, Any]]:
+        return [
+            {**self.entries[key[2]], "rank": offset + position + 1}
+            for position, key in enumerate(self.keys[offset:offset + limit])
+        ]
+
+leaderboard_cache = TTLCache(LEADERBOARD_CACHE_BOARDS, LEADERBOARD_REFRESH_SECONDS)
+
+def leaderboard_windows(moment: datetime) -> List[str]:
+    iso_year, iso_week, _ = moment.isocalendar()
+    return ["all", f"month:{moment:%Y-%m}", f"week:{iso_year}-W{iso_week:02d}"]
+
+def board_key(scope: str, window: str, subject_type: str) -> str:
+    return f"{scope}|{window}|{subject_type}"
+
+def game_side_points(score: Dict[str, Any], side: str, subject_id: str) -> int:
+    """Scores are keyed either by participant id or positionally ("player1", "team2")"""
+    return int(score.get(subject_id, score.get(side, 0)) or 0)
+
+def game_results(game: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Per-participant outcome of a completed game"""
+    score = game.get("score") or {}
+    winner = game.get("winner")
+    results = []
+    for subject_type, sides in (("player", ("player1", "player2")), ("team", ("team1", "team2"))):
+        ids = [game.get(f"{side}_id") for side in sides]
+        points = [game_side_points(score, side, subject_id or side) for side, subject_id in zip(sides, ids)]
+        for index, subject_id in enumerate(ids):
+            if not subject_id:
+                continue
+            opponent_points = points[1 - index]
+            if winner in ids:
+                outcome = "win" if winner == subject_id else "loss"
+            elif points[index] != opponent_points:
+                outcome = "win" if points[index] > opponent_points else "loss"
+            else:
+                outcome = "draw"
+            results.append({
+                "subject_type": subject_type,
+                "subject_id": subject_id,
+                "outcome": outcome,
+                "points": points[index]
+            })
+    return results
+
+async def record_game_result(game: Dict[str, Any], completed_at: datetime):
+    """Fold one completed game into every board it belongs to"""
+    scopes = ["global", f"court:{game['court_id']}"]
+    windows = leaderboard_windows(completed_at)
+    operations = []
+    updates = []
+    for result in game_results(game):
+        increments = {
+            "games": 1,
+            "points": result["points"],
+            "wins": int(result["outcome"] == "win"),
+            "losses": int(result["outcome"] == "loss"),
+            "draws": int(result["outcome"] == "draw")
+        }
+        for scope in scopes:
+            for window in windows:
+                operations.append(UpdateOne(
+                    {"scope": scope, "window": window,
+                     "subject_type": result["subject_type"], "subject_id": result["subject_id"]},
+                    {"$inc": increments, "$set": {"updated_at": completed_at}},
+                    upsert=True
+                ))
+                updates.append((board_key(scope, window, result["subject_type"]), result, increments))
+    if operations:
+        await db.leaderboard.bulk_write(operations, ordered=False)
+    
+    # Boards already loaded in this process are patched in place rather than reloaded
+    for key, result, increments in updates:
+        board = leaderboard_cache.get(key)
+        if board is None:
+            continue
+        entry = dict(board.entries.get(result["subject_id"]) or
+                     {"subject_type": result["subject_type"], "subject_id": result["subject_id"]})
+        for field, amount in increments.items():
+            entry[field] = entry.get(field, 0) + amount
+        board.upsert(entry)
+
+async def load_leaderboard_board(scope: str, window: str, subject_type: str) -> LeaderboardIndex:
+    key = board_key(scope, window, subject_type)
+    board = leaderboard_cache.get(key)
+    if board is None:
+        entries = await db.leaderboard.find(
+            {"scope": scope, "window": window, "subject_type": subject_type},
+            {"_id": 0, "subject_id": 1, "subject_type": 1, "wins": 1, "losses": 1,
+             "draws": 1, "points": 1, "games": 1}
+        ).to_list(None)
+        board = LeaderboardIndex(entries)
+        leaderboard_cache.set(key, board)
+    return board
+
+def resolve_leaderboard_board(court_id: Optional[str], window: str, period: Optional[str]):
+    scope = f"court:{court_id}" if court_id else "global"
+    if window == "all":
+        return scope, "all"
+    if period is None:
+        current = dict(window_key.split(":", 1) for window_key in leaderboard_windows(datetime.utcnow())[1:])
+        period = current[window]
+    return scope, f"{window}:{period}"
+
+# Response Cache
+class ResponseCacheBackend(ABC):
+    """Storage interface for cached responses; implement it over a shared store
+    (e.g. Redis) to share entries and invalidations between processes"""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Dict[str, Any]):
+        ...
+
+    @abstractmethod
+    async def generation(self, namespace: str) -> int:
+        ...
+
+    @abstractmethod
+    async def bump_generation(self, namespace: str):
+        ...
+
+class InMemoryResponseCacheBackend(ResponseCacheBackend):
+    """Per-process LRU with TTL; invalidating a namespace bumps its generation so
+    stale keys are never read again and age out of the LRU"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.entries = TTLCache(max_entries, ttl_seconds)
+        self.generations: Dict[str, int] = {}
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get(key)
+
+    async def set(self, key: str, value: Dict[str, Any]):
+        self.entries.set(key, value)
+
+    async def generation(self, namespace: str) -> int:
+        return self.generations.get(namespace, 0)
+
+    async def bump_generation(self, namespace: str):
+        self.generations[namespace] = self.generations.get(namespace, 0) + 1
+
+response_cache: ResponseCacheBackend = InMemoryResponseCacheBackend(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL_SECONDS)
+
+# Cacheable GET routes and the namespace whose writes invalidate them
+RESPONSE_CACHE_ROUTES = [
+    (re.compile(r"^/api/courts$"), "courts"),
+    (re.compile(r"^/api/courts/(?!availability$)[^/]+$"), "courts"),
+    (re.compile(r"^/api/tournaments$"), "tournaments"),
+    (re.compile(r"^/api/teams$"), "teams"),
+    (re.compile(r"^/api/coaches$"), "coaches"),
+]
+
+def response_cache_namespace(request: Request) -> Optional[str]:
+    if request.method != "GET":
+        return None
+    for pattern, namespace in RESPONSE_CACHE_ROUTES:
+        if pattern.match(request.url.path):
+            return namespace
+    return None
+
+namespace_writes: Dict[str, float] = {}
+
+async def invalidate_response_cache(*namespaces: str):
+    for namespace in namespaces:
+        namespace_writes[namespace] = time.monotonic()
+        await response_cache.bump_generation(namespace)
+
+def read_database(namespace: str):
+    """Database to serve a public read of `namespace` from: secondaries via db_reads,
+    unless this process wrote to the namespace within MONGO_READ_MAX_STALENESS_SECONDS"""
+    written_at = namespace_writes.get(namespace)
+    if written_at is not None and time.monotonic() - written_at < MONGO_READ_MAX_STALENESS_SECONDS:
+        return db
+    return db_reads
+
+# Live Scores
+class ScoreSubscription:
+    """One viewer connection; keeps only the latest undelivered update per game, so a
+    slow viewer skips intermediate scores instead of building up a backlog"""
+
+    def __init__(self, topic: str):
+        self.topic = topic
+        self.pending: Dict[str, Dict[str, Any]] = {}
+        self.ready = asyncio.Event()
+
+    def offer(self, update: Dict[str, Any]):
+        self.pending[update["game_id"]] = update
+        self.ready.set()
+
+    async def next_batch(self) -> List[Dict[str, Any]]:
+        await self.ready.wait()
+        if LIVE_SCORE_COALESCE_SECONDS > 0:
+            await asyncio.sleep(LIVE_SCORE_COALESCE_SECONDS)
+        self.ready.clear()
+        batch = list(self.pending.values())
+        self.pending.clear()
+        return batch
+
+def live_score_update(game: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "game_id": game["id"],
+        "court_id": game.get("court_id"),
+        "score": game.get("score", {}),
+        "status": game.get("status"),
+        "winner": game.get("winner")
+    }
+
+class ScoreHub:
+    """In-process pub/sub for live scores, keyed by "game:<id>" and "court:<id>" topics"""
+
+    def __init__(self):
+        self.subscriptions: Dict[str, set] = {}
+
+    def subscribe(self, topic: str) -> ScoreSubscription:
+        subscription = ScoreSubscription(topic)
+        self.subscriptions.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: ScoreSubscription):
+        subscribers = self.subscriptions.get(subscription.topic)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self.subscriptions[subscription.topic]
+
+    def has_subscribers(self) -> bool:
+        return bool(self.subscriptions)
+
+    def publish_game(self, game: Dict[str, Any]):
+        update = live_score_update(game)
+        for topic in (f"game:{game['id']}", f"court:{game.get('court_id')}"):
+            for subscription in self.subscriptions.get(topic, ()):
+                subscription.offer(update)
+
+score_hub = ScoreHub()
+
+LIVE_GAME_PROJECTION = {"_id": 0, "id": 1, "court_id": 1, "score": 1, "status": 1, "winner": 1}
+
+async def stream_live_scores(websocket: WebSocket, topic: str, snapshot: List[Dict[str, Any]]):
+    await websocket.accept()
+    subscription = score_hub.subscribe(topic)
+    for game in snapshot:
+        subscription.offer(live_score_update(game))
+    
+    async def wait_for_disconnect():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    
+    disconnected = asyncio.create_task(wait_for_disconnect())
+    try:
+        while True:
+            batch = asyncio.create_task(subscription.next_batch())
+            done, _ = await asyncio.wait({batch, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if batch not in done:
+                batch.cancel()
+                break
+            try:
+                await asyncio.wait_for(
+                    websocket.send_text(json.dumps(batch.result(), default=json_default)),
+                    LIVE_SCORE_SEND_TIMEOUT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                # The viewer cannot keep up even with coalesced updates; drop it
+                await websocket.close(code=1013)
+                break
+    finally:
+        disconnected.cancel()
+        score_hub.unsubscribe(subscription)
+
+# Court Reservations
+def booking_slots(start: datetime, end: datetime) -> List[datetime]:
+    """Every slot start touched by [start, end), aligned down to the slot grid"""
+    slot = start.replace(minute=start.minute - start.minute % BOOKING_SLOT_MINUTES, second=0, microsecond=0)
+    slots = []
+    while slot < end:
+        slots.append(slot)
+        slot += timedelta(minutes=BOOKING_SLOT_MINUTES)
+    return slots
+
+async def find_overlapping_booking(court_id: str, start: datetime, end: datetime):
+    return await db.bookings.find_one({
+        "court_id": court_id,
+        "end_time": {"$gt": start},
+        "start_time": {"$lt": end},
+        "status": {"$ne": BookingStatus.CANCELLED.value}
+    }, {"_id": 0, "id": 1})
+
+async def release_court_slots(booking_id: str):
+    await db.court_slots.delete_many({"booking_id": booking_id})
+
+async def reserve_court_slots(court_id: str, start: datetime, end: datetime, booking_id: str):
+    """Claim the booking's slots; the unique (court_id, slot_start) index makes this atomic"""
+    slots = [
+        {"court_id": court_id, "slot_start": slot, "booking_id": booking_id}
+        for slot in booking_slots(start, end)
+    ]
+    try:
+        await db.court_slots.insert_many(slots, ordered=True)
+    except BulkWriteError:
+        await release_court_slots(booking_id)
+        raise HTTPException(status_code=409, detail="Court is already booked for this time")
+
+# Court Check-In
+# Gate readers look codes up in a per-court map of the current day's bookings.
+# The map is rebuilt when the day rolls over and extended by create_booking; a
+# code it does not know (booked through another process) falls back to Mongo.
+CHECK_IN_STATUSES = [BookingStatus.PENDING.value, BookingStatus.CONFIRMED.value]
+CHECK_IN_PROJECTION = {"_id": 0, "id": 1, "user_id": 1, "court_id": 1, "rfid_code": 1,
+                       "start_time": 1, "end_time": 1, "status": 1, "checked_in_at": 1}
+
+def check_in_clock() -> datetime:
+    """Current wall-clock time at the courts, comparable with booking times"""
+    return datetime.now(CHECKIN_TIMEZONE).replace(tzinfo=None)
+
+class CheckInIndex:
+    def __init__(self):
+        self.day: Optional[datetime] = None
+        self.courts: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+
+    def covers(self, booking: Dict[str, Any]) -> bool:
+        if self.day is None:
+            return False
+        day_end = self.day + timedelta(days=1, minutes=CHECKIN_EARLY_MINUTES)
+        return booking["end_time"] > self.day and booking["start_time"] < day_end
+
+    def add(self, booking: Dict[str, Any]):
+        if self.covers(booking) and booking["status"] in CHECK_IN_STATUSES:
+            entries = self.courts.setdefault(booking["court_id"], {}).setdefault(booking["rfid_code"], [])
+            if all(entry["id"] != booking["id"] for entry in entries):
+                entries.append(booking)
+
+    def lookup(self, court_id: str, rfid_code: str, now: datetime) -> Optional[Dict[str, Any]]:
+        for booking in self.courts.get(court_id, {}).get(rfid_code, ()):
+            if booking_open_for_check_in(booking, now):
+                return booking
+        return None
+
+def booking_open_for_check_in(booking: Dict[str, Any], now: datetime) -> bool:
+    opens = booking["start_time"] - timedelta(minutes=CHECKIN_EARLY_MINUTES)
+    return opens <= now < booking["end_time"] and booking["status"] in CHECK_IN_STATUSES
+
+check_in_index = CheckInIndex()
+
+async def load_check_in_index(day: datetime):
+    index = CheckInIndex()
+    index.day = day
+    cursor = db.bookings.find({
+        "end_time": {"$gt": day},
+        "start_time": {"$lt": day + timedelta(days=1, minutes=CHECKIN_EARLY_MINUTES)},
+        "status": {"$in": CHECK_IN_STATUSES}
+    }, CHECK_IN_PROJECTION)
+    async for booking in cursor:
+        index.add(booking)
+    # Swapped in whole so lookups never see a half-built day
+    global check_in_index
+    check_in_index = index
+
+# Court Availability
+def occupancy_masks(start: datetime, end: datetime) -> Dict[str, List[int]]:
+    """Per-day [am, pm] bit masks of the slots covered by [start, end)"""
+    masks: Dict[str, List[int]] = {}
+    for slot in booking_slots(start, end):
+        index = (slot.hour * 60 + slot.minute) // BOOKING_SLOT_MINUTES
+        words = masks.setdefault(slot.strftime("%Y-%m-%d"), [0, 0])
+        words[index // SLOTS_PER_WORD] |= 1 << (index % SLOTS_PER_WORD)
+    return masks
+
+async def mark_court_occupancy(court_id: str, start: datetime, end: datetime):
+    operations = [
+        UpdateOne(
+            {"court_id": court_id, "day": day},
+            {"$bit": {"am": {"or": Int64(am)}, "pm": {"or": Int64(pm)}}},
+            upsert=True
+        )
+        for day, (am, pm) in occupancy_masks(start, end).items()
+    ]
+    if operations:
+        await db.court_occupancy.bulk_write(operations, ordered=False)
+
+async def rebuild_court_occupancy():
+    """Derive the bitmaps from db.bookings; used the first time the collection is empty"""
+    masks: Dict[tuple, List[int]] = {}
+    cursor = db.bookings.find(
+        {"status": {"$ne": BookingStatus.CANCELLED.value}},
+        {"_id": 0, "court_id": 1, "start_time": 1, "end_time": 1}
+    )
+    async for booking in cursor:
+        for day, (am, pm) in occupancy_masks(booking["start_time"], booking["end_time"]).items():
+            words = masks.setdefault((booking["court_id"], day), [0, 0])
+            words[0] |= am
+            words[1] |= pm
+    operations = [
+        UpdateOne(
+            {"court_id": court_id, "day": day},
+            {"$bit": {"am": {"or": Int64(am)}, "pm": {"or": Int64(pm)}}},
+            upsert=True
+        )
+        for (court_id, day), (am, pm) in masks.items()
+    ]
+    if operations:
+        await db.court_occupancy.bulk_write(operations, ordered=False)
+
+def occupancy_bits(words: np.ndarray) -> np.ndarray:
+    """Unpack (..., 2) am/pm words into (..., SLOTS_PER_DAY) slot bits"""
+    shifts = np.arange(SLOTS_PER_WORD, dtype=np.uint64)
+    bits = (words[..., None] >> shifts) & np.uint64(1)
+    return bits.reshape(*words.shape[:-1], SLOTS_PER_DAY).astype(bool)
+
+def slot_fits(free: np.ndarray, slots_needed: int) -> np.ndarray:
+    """fits[..., i] is True when slots i .. i+slots_needed-1 are all free"""
+    running = np.concatenate([np.zeros((*free.shape[:-1], 1), dtype=np.int32), np.cumsum(free, axis=-1, dtype=np.int32)], axis=-1)
+    return (running[..., slots_needed:] - running[..., :-slots_needed]) == slots_needed
+
+def parse_slot_of_day(value: str) -> int:
+    if value == "24:00":
+        return SLOTS_PER_DAY
+    try:
+        parsed = datetime.strptime(value, "%H:%M")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid time of day: {value}")
+    return (parsed.hour * 60 + parsed.minute) // BOOKING_SLOT_MINUTES
+
+def slot_clock(index: int) -> str:
+    minutes = index * BOOKING_SLOT_MINUTES
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+# Tournament Brackets
+# Brackets are a flat list of matches linked by index: each match names the
+# [match, slot] its winner (and, in double elimination, its loser) moves to, so a
+# result only writes the decided match's winner and the slots it feeds. Every field
+# written is still empty beforehand, which lets concurrent results merge safely.
+BYE = "BYE"
+BRACKET_UPDATE_ATTEMPTS = 5
+
+def seed_positions(size: int) -> List[int]:
+    """Standard bracket order of 1-based seeds, e.g. [1, 8, 4, 5, 2, 7, 3, 6]"""
+    order = [1]
+    while len(order) < size:
+        mirror = 2 * len(order) + 1
+        order = [seed for top in order for seed in (top, mirror - top)]
+    return order
+
+def build_elimination_bracket(seeds: List[str], double: bool) -> List[Dict[str, Any]]:
+    size = 2
+    while size < len(seeds):
+        size *= 2
+    entrants = [seeds[seed - 1] if seed <= len(seeds) else BYE for seed in seed_positions(size)]
+    matches: List[Dict[str, Any]] = []
+
+    def add_round(stage: str, round_number: int, count: int) -> List[int]:
+        start = len(matches)
+        matches.extend(
+            BracketMatch(stage=stage, round=round_number).dict()
+            for _ in range(count)
+        )
+        return list(range(start, start + count))
+
+    # Winners bracket: round r feeds match i // 2 of round r + 1
+    winners_rounds = [add_round("winners", 1, size // 2)]
+    for position, match_index in enumerate(winners_rounds[0]):
+        matches[match_index]["slots"] = entrants[2 * position:2 * position + 2]
+    while len(winners_rounds[-1]) > 1:
+        previous = winners_rounds[-1]
+        current = add_round("winners", len(winners_rounds) + 1, len(previous) // 2)
+        for position, match_index in enumerate(previous):
+            matches[match_index]["winner_to"] = [current[position // 2], position % 2]
+        winners_rounds.append(current)
+
+    if double:
+        # Losers bracket: first-round losers pair up, then each later winners round
+        # drops its losers in against the surviving losers-bracket players
+        final = None
+        losers_round = add_round("losers", 1, len(winners_rounds[0]) // 2)
+        for position, match_index in enumerate(winners_rounds[0]):
+            if losers_round:
+                matches[match_index]["loser_to"] = [losers_round[position // 2], position % 2]
+        round_number = 1
+        for winners_round in winners_rounds[1:]:
+            round_number += 1
+            drop_round = add_round("losers", round_number, len(winners_round))
+            for position, match_index in enumerate(losers_round):
+                matches[match_index]["winner_to"] = [drop_round[position], 0]
+            for position, match_index in enumerate(winners_round):
+                matches[match_index]["loser_to"] = [drop_round[position], 1]
+            losers_round = drop_round
+            if len(drop_round) > 1:
+                round_number += 1
+                losers_round = add_round("losers", round_number, len(drop_round) // 2)
+                for position, match_index in enumerate(drop_round):
+                    matches[match_index]["winner_to"] = [losers_round[position // 2], position % 2]
+        final = add_round("final", 1, 1)[0]
+        matches[winners_rounds[-1][0]]["winner_to"] = [final, 0]
+        if losers_round:
+            matches[losers_round[0]]["winner_to"] = [final, 1]
+        else:
+            matches[winners_rounds[-1][0]]["loser_to"] = [final, 1]
+
+    changes: Dict[str, Any] = {}
+    for match_index in winners_rounds[0]:
+        settle_bye(matches, match_index, changes)
+    return matches
+
+def build_round_robin(seeds: List[str]) -> List[Dict[str, Any]]:
+    """Circle method: every participant meets every other once; byes are left out"""
+    players = list(seeds) + ([BYE] if len(seeds) % 2 else [])
+    matches = []
+    for round_number in range(1, len(players)):
+        for position in range(len(players) // 2):
+            pair = [players[position], players[-1 - position]]
+            if BYE not in pair:
+                matches.append(BracketMatch(stage="round_robin", round=round_number, slots=pair).dict())
+        players = [players[0], players[-1]] + players[1:-1]
+    return matches
+
+# changes collects every field written as {"bracket.matches.<i>.<field>": value}
+def place_in_slot(matches: List[Dict[str, Any]], target: Optional[List[int]], participant: str,
+                  changes: Dict[str, Any]):
+    if target is None:
+        return
+    match_index, slot = target
+    matches[match_index]["slots"][slot] = participant
+    changes[f"bracket.matches.{match_index}.slots.{slot}"] = participant
+    settle_bye(matches, match_index, changes)
+
+def settle_bye(matches: List[Dict[str, Any]], match_index: int, changes: Dict[str, Any]):
+    """A filled match facing a bye is decided immediately and its players move on"""
+    match = matches[match_index]
+    slots = match["slots"]
+    if match["winner"] is not None or None in slots or BYE not in slots:
+        return
+    winner = slots[1] if slots[0] == BYE else slots[0]
+    decide_match(matches, match_index, winner, changes)
+
+def decide_match(matches: List[Dict[str, Any]], match_index: int, winner: str, changes: Dict[str, Any]):
+    match = matches[match_index]
+    loser = match["slots"][1] if match["slots"][0] == winner else match["slots"][0]
+    match["winner"] = winner
+    changes[f"bracket.matches.{match_index}.winner"] = winner
+    place_in_slot(matches, match["winner_to"], winner, changes)
+    place_in_slot(matches, match["loser_to"], loser, changes)
+
+def bracket_champion(bracket: Dict[str, Any]) -> Optional[str]:
+    matches = bracket["matches"]
+    if bracket["format"] == TournamentFormat.ROUND_ROBIN.value:
+        if not matches or any(match["winner"] is None for match in matches):
+            return None
+        wins: Dict[str, int] = {}
+        for match in matches:
+            wins[match["winner"]] = wins.get(match["winner"], 0) + 1
+        return max(bracket["seeds"], key=lambda participant: wins.get(participant, 0))
+    final = matches[-1]
+    return final["winner"] if final["winner"] not in (None, BYE) else None
+
+async def seed_participants(participants: List[str]) -> List[str]:
+    """Order participants by all-time leaderboard rank; unranked keep registration order"""
+    board = await load_leaderboard_board("global", "all", "player")
+    ranked = sorted((rank, participant) for participant in participants
+                    if (rank := board.rank(participant)) is not None)
+    seeded = [participant for _, participant in ranked]
+    placed = set(seeded)
+    return seeded + [participant for participant in participants if participant not in placed]
+
+async def generate_bracket(tournament: Dict[str, Any]) -> Dict[str, Any]:
+    tournament_format = TournamentFormat(tournament.get("format", TournamentFormat.SINGLE_ELIMINATION.value))
+    seeds = await seed_participants(tournament["participants"])
+    if tournament_format == TournamentFormat.ROUND_ROBIN:
+        matches = build_round_robin(seeds)
+    else:
+        matches = build_elimination_bracket(seeds, tournament_format == TournamentFormat.DOUBLE_ELIMINATION)
+    return Bracket(format=tournament_format, seeds=seeds, matches=matches).dict()
+
+async def advance_bracket(game: Dict[str, Any]):
+    """Record a completed tournament game's winner and move players along the bracket"""
+    winners = [result["subject_id"] for result in game_results(game) if result["outcome"] == "win"]
+    if not winners:
+        return
+    
+    # A concurrent result can fill a slot between the read and the write; the guard
+    # then misses and the result is replayed against the fresh bracket
+    for _ in range(BRACKET_UPDATE_ATTEMPTS):
+        tournament = await db.tournaments.find_one(
+            {"id": game["tournament_id"], "bracket": {"$ne": None}},
+            {"_id": 0, "id": 1, "bracket": 1}
+        )
+        if not tournament:
+            return
+        matches = tournament["bracket"]["matches"]
+        
+        match_index = game.get("bracket_match")
+        if match_index is None:
+            # Games created without a bracket position are matched on their participants
+            players = {game.get("player1_id"), game.get("player2_id"), game.get("team1_id"), game.get("team2_id")}
+            match_index = next((index for index, match in enumerate(matches)
+                                if match["winner"] is None and set(match["slots"]) <= players), None)
+        if match_index is None or not 0 <= match_index < len(matches):
+            return
+        match = matches[match_index]
+        winner = next((participant for participant in winners if participant in match["slots"]), None)
+        if winner is None or match["winner"] is not None or None in match["slots"]:
+            return
+        
+        changes: Dict[str, Any] = {}
+        decide_match(matches, match_index, winner, changes)
+        changes[f"bracket.matches.{match_index}.game_id"] = game["id"]
+        # Every written field must still be empty, so a replayed result cannot advance
+        # twice and concurrent results never overwrite each other's slots
+        updated = await db.tournaments.find_one_and_update(
+            {"id": tournament["id"], **{path: None for path in changes}},
+            {"$set": changes},
+            projection={"id": 1, "bracket": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if updated:
+            break
+    else:
+        logger.warning("Bracket for tournament %s kept changing, result of game %s not applied",
+                       game["tournament_id"], game["id"])
+        return
+    
+    champion = bracket_champion(updated["bracket"])
+    if champion:
+        await db.tournaments.update_one(
+            {"id": updated["id"], "bracket.champion": None},
+            {"$set": {"bracket.champion": champion, "status": TournamentStatus.COMPLETED.value}}
+        )
+    await invalidate_response_cache("tournaments")
+
+# Ratings
+# Player Elo ratings live in User.stats (rating, rated_games). Completed 1v1 games
+# with a winner move both players live; recompute_ratings replays the whole games
+# history when the rating parameters change.
+def elo_delta(winner_rating, loser_rating):
+    """Points the winner takes from the loser; works on scalars and NumPy arrays alike"""
+    expected = 1.0 / (1.0 + 10.0 ** ((loser_rating - winner_rating) / RATING_SCALE))
+    return RATING_K_FACTOR * (1.0 - expected)
+
+def rated_players(game: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    """(winner, loser) for a game that counts toward ratings"""
+    players = (game.get("player1_id"), game.get("player2_id"))
+    winner = game.get("winner")
+    if None in players or players[0] == players[1] or winner not in players:
+        return None
+    return winner, players[1] if winner == players[0] else players[0]
+
+async def skill_ratings(user_ids: List[str]) -> Dict[str, float]:
+    ratings = {user_id: RATING_INITIAL for user_id in user_ids}
+    async for user in db.users.find({"id": {"$in": user_ids}}, {"_id": 0, "id": 1, "stats.rating": 1}):
+        ratings[user["id"]] = (user.get("stats") or {}).get("rating", RATING_INITIAL)
+    return ratings
+
+async def record_game_rating(game: Dict[str, Any]) -> Dict[str, float]:
+    """Apply one game's Elo change; returns the players' new ratings"""
+    players = rated_players(game)
+    if players is None:
+        return {}
+    ratings = await skill_ratings(list(players))
+    delta = elo_delta(ratings[players[0]], ratings[players[1]])
+    
+    # The change is applied relative to the stored value in one atomic update, so
+    # games finishing concurrently for the same player do not overwrite each other
+    updated = {}
+    for user_id, change in zip(players, (delta, -delta)):
+        user = await db.users.find_one_and_update(
+            {"id": user_id},
+            [{"$set": {
+                "stats.rating": {"$add": [{"$ifNull": ["$stats.rating", RATING_INITIAL]}, change]},
+                "stats.rated_games": {"$add": [{"$ifNull": ["$stats.rated_games", 0]}, 1]}
+            }}],
+            projection={"stats.rating": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if user:
+            updated[user_id] = user["stats"]["rating"]
+            user_cache.invalidate(user_id)
+    return updated
+
+class RatingTable:
+    """Dense rating and game-count arrays indexed by player position"""
+
+    def __init__(self):
+        self.positions: Dict[str, int] = {}
+        self.ratings = np.full(1024, RATING_INITIAL)
+        self.games = np.zeros(1024, dtype=np.int64)
+
+    def position(self, user_id: str) -> int:
+        position = self.positions.get(user_id)
+        if position is None:
+            position = self.positions[user_id] = len(self.positions)
+            if position == len(self.ratings):
+                self.ratings = np.concatenate([self.ratings, np.full(position, RATING_INITIAL)])
+                self.games = np.concatenate([self.games, np.zeros(position, dtype=np.int64)])
+        return position
+
+    def apply_chunk(self, pairs: List[Tuple[str, str]]):
+        """Replay a chunk of (winner, loser) games in order. Games are split into waves
+        in which no player appears twice; each wave is one vectorized update, and a
+        player's games land in successive waves so the sequential result is preserved."""
+        winners = np.fromiter((self.position(winner) for winner, _ in pairs), dtype=np.int64, count=len(pairs))
+        losers = np.fromiter((self.position(loser) for _, loser in pairs), dtype=np.int64, count=len(pairs))
+        last_wave: Dict[int, int] = {}
+        waves = np.empty(len(pairs), dtype=np.int64)
+        for game, (winner, loser) in enumerate(zip(winners.tolist(), losers.tolist())):
+            wave = max(last_wave.get(winner, -1), last_wave.get(loser, -1)) + 1
+            last_wave[winner] = last_wave[loser] = waves[game] = wave
+        
+        order = np.argsort(waves, kind="stable")
+        boundaries = np.flatnonzero(np.diff(waves[order])) + 1
+        for games in np.split(order, boundaries):
+            wave_winners, wave_losers = winners[games], losers[games]
+            delta = elo_delta(self.ratings[wave_winners], self.ratings[wave_losers])
+            self.ratings[wave_winners] += delta
+            self.ratings[wave_losers] -= delta
+        self.games += np.bincount(np.concatenate([winners, losers]), minlength=len(self.games))
+
+async def recompute_ratings() -> int:
+    """Rebuild every player's rating from the completed games history, streamed in
+    chunks; returns the number of players written"""
+    table = RatingTable()
+    chunk: List[Tuple[str, str]] = []
+    cursor = db.games.find(
+        {"status": "completed", "winner": {"$ne": None}},
+        {"_id": 0, "player1_id": 1, "player2_id": 1, "winner": 1}
+    ).sort([("status", 1), ("actual_end_time", 1), ("id", 1)]).batch_size(RATING_RECOMPUTE_CHUNK)
+    async for game in cursor:
+        players = rated_players(game)
+        if players is None:
+            continue
+        chunk.append(players)
+        if len(chunk) >= RATING_RECOMPUTE_CHUNK:
+            table.apply_chunk(chunk)
+            chunk = []
+    if chunk:
+        table.apply_chunk(chunk)
+    
+    user_ids = list(table.positions)
+    for start in range(0, len(user_ids), RATING_RECOMPUTE_CHUNK):
+        operations = [
+            UpdateOne({"id": user_id}, {"$set": {
+                "stats.rating": float(table.ratings[position]),
+                "stats.rated_games": int(table.games[position])
+            }})
+            for user_id, position in ((user_id, table.positions[user_id])
+                                      for user_id in user_ids[start:start + RATING_RECOMPUTE_CHUNK])
+        ]
+        await db.users.bulk_write(operations, ordered=False)
+    
+    user_cache.clear()
+    await load_matchmaking_index()
+    return len(user_ids)
+
+# Matchmaking
+# Open challenges live in a grid of (rating bucket, time window) cells. A search
+# walks outward ring by ring from the seeker's cell, so it only touches the
+# challenges near the seeker regardless of how many are open overall.
+
+def naive_utc(moment: datetime) -> datetime:
+    """Stored datetimes are naive UTC; convert offset-aware input to match"""
+    if moment.tzinfo is None:
+        return moment
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+class MatchmakingIndex:
+    def __init__(self):
+        self.cells: Dict[Tuple[int, Optional[int]], Dict[str, Dict[str, Any]]] = {}
+        self.challenges: Dict[str, Tuple[Tuple[int, Optional[int]], float]] = {}
+        self.by_creator: Dict[str, set] = {}
+
+    @staticmethod
+    def rating_bucket(rating: float) -> int:
+        return int(rating // MATCHMAKING_RATING_BUCKET)
+
+    @staticmethod
+    def time_window(moment: Optional[datetime]) -> Optional[int]:
+        if moment is None:
+            return None
+        return int(moment.timestamp() // (MATCHMAKING_WINDOW_HOURS * 3600))
+
+    def __len__(self):
+        return len(self.challenges)
+
+    def clear(self):
+        self.cells.clear()
+        self.challenges.clear()
+        self.by_creator.clear()
+
+    def add(self, challenge: Dict[str, Any], rating: float):
+        self.remove(challenge["id"])
+        cell = (self.rating_bucket(rating), self.time_window(challenge.get("scheduled_date")))
+        self.cells.setdefault(cell, {})[challenge["id"]] = challenge
+        self.challenges[challenge["id"]] = (cell, rating)
+        self.by_creator.setdefault(challenge["created_by"], set()).add(challenge["id"])
+
+    def remove(self, challenge_id: str):
+        located = self.challenges.pop(challenge_id, None)
+        if located is None:
+            return
+        cell = self.cells[located[0]]
+        challenge = cell.pop(challenge_id)
+        if not cell:
+            del self.cells[located[0]]
+        created = self.by_creator[challenge["created_by"]]
+        created.discard(challenge_id)
+        if not created:
+            del self.by_creator[challenge["created_by"]]
+
+    def rerate(self, user_id: str, rating: float):
+        """Move a creator's open challenges after their rating changes"""
+        for challenge_id in list(self.by_creator.get(user_id, ())):
+            self.add(self.cells[self.challenges[challenge_id][0]][challenge_id], rating)
+
+    def ring(self, center: Tuple[int, int], distance: int):
+        rating_center, window_center = center
+        for rating_offset in range(-distance, distance + 1):
+            bucket = rating_center + rating_offset
+            if abs(rating_offset) == distance:
+                # Unscheduled challenges fit any time, so they join the ring by rating alone
+                yield (bucket, None)
+                window_offsets = range(-distance, distance + 1)
+            else:
+                window_offsets = (-distance, distance) if distance else (0,)
+            for window_offset in window_offsets:
+                yield (bucket, window_center + window_offset)
+
+    def find(self, user_id: str, rating: float, moment: datetime, court_id: Optional[str],
+             limit: int) -> List[Tuple[float, Dict[str, Any]]]:
+        now = datetime.utcnow()
+        center = (self.rating_bucket(rating), self.time_window(moment))
+        scored: List[Tuple[float, Dict[str, Any]]] = []
+        expired = []
+        for distance in range(MATCHMAKING_MAX_RINGS + 1):
+            for cell in self.ring(center, distance):
+                for challenge_id, challenge in self.cells.get(cell, {}).items():
+                    scheduled = challenge.get("scheduled_date")
+                    if scheduled is not None and scheduled < now:
+                        expired.append(challenge_id)
+                        continue
+                    if challenge["created_by"] == user_id:
+                        continue
+                    if challenge.get("challenged_user") not in (None, user_id):
+                        continue
+                    hours_apart = abs((scheduled - moment).total_seconds()) / 3600 if scheduled else MATCHMAKING_WINDOW_HOURS / 2
+                    score = (abs(self.challenges[challenge_id][1] - rating) / MATCHMAKING_RATING_BUCKET
+                             + hours_apart / MATCHMAKING_WINDOW_HOURS
+                             + (1.0 if court_id and challenge.get("court_id") != court_id else 0.0))
+                    scored.append((score, challenge))
+            # Anything beyond the next ring scores at least `distance` worse, so stop
+            # once the best `limit` found so far cannot be beaten from further out
+            if len(scored) >= limit:
+                scored.sort(key=lambda item: item[0])
+                if scored[limit - 1][0] <= distance:
+                    break
+        # Challenges whose time has passed can no longer be matched, so searches
+        # drop the ones they walk past
+        for challenge_id in expired:
+            self.remove(challenge_id)
+        scored.sort(key=lambda item: item[0])
+        return scored[:limit]
+
+matchmaking_index = MatchmakingIndex()
+MATCHMAKING_VERIFY_ATTEMPTS = 3
+
+async def load_matchmaking_index():
+    challenges = await db.challenges.find(
+        {"status": ChallengeStatus.OPEN.value,
+         "$or": [{"scheduled_date": None}, {"scheduled_date": {"$gte": datetime.utcnow()}}]},
+        {"_id": 0}
+    ).to_list(None)
+    ratings = await skill_ratings(list({challenge["created_by"] for challenge in challenges}))
+    index = MatchmakingIndex()
+    for challenge in challenges:
+        index.add(challenge, ratings[challenge["created_by"]])
+    # Swapped in whole so searches never see a half-built index
+    global matchmaking_index
+    matchmaking_index = index
+
+async def matchmaking_reload_loop():
+    while True:
+        await asyncio.sleep(MATCHMAKING_RELOAD_SECONDS)
+        try:
+            await load_matchmaking_index()
+        except PyMongoError as e:
+            logger.error(f"Matchmaking index reload failed: {e}")
+
+async def verified_matches(user_id: str, rating: float, moment: datetime, court_id: Optional[str],
+                           limit: int) -> List[Tuple[float, Dict[str, Any], float]]:
+    """Index matches re-checked against Mongo, as (score, challenge, creator rating):
+    challenges accepted or cancelled through another process are dropped and creators
+    whose rating moved are re-bucketed, then the search runs again until the
+    candidates it returns are current"""
+    for _ in range(MATCHMAKING_VERIFY_ATTEMPTS):
+        matches = matchmaking_index.find(user_id, rating, moment, court_id, limit)
+        candidates = {challenge["id"]: challenge for _, challenge in matches}
+        open_ids = {challenge["id"] async for challenge in db.challenges.find(
+            {"id": {"$in": list(candidates)}, "status": ChallengeStatus.OPEN.value,
+             "challenged_user": {"$in": [None, user_id]}},
+            {"_id": 0, "id": 1}
+        )}
+        ratings = await skill_ratings(list({challenge["created_by"] for challenge in candidates.values()}))
+        
+        changed = False
+        for challenge_id, challenge in candidates.items():
+            if challenge_id not in open_ids:
+                matchmaking_index.remove(challenge_id)
+                changed = True
+            elif ratings[challenge["created_by"]] != matchmaking_index.challenges[challenge_id][1]:
+                matchmaking_index.rerate(challenge["created_by"], ratings[challenge["created_by"]])
+                changed = True
+        if not changed:
+            return [(score, challenge, ratings[challenge["created_by"]]) for score, challenge in matches]
+    return [(score, challenge, ratings[challenge["created_by"]])
+            for score, challenge in matchmaking_index.find(user_id, rating, moment, court_id, limit)
+            if challenge["id"] in open_ids]
+
+
+# Search
+# Searchable fields per document type with their ranking weight, plus the fields
+# returned as the result's title and subtitle; members_only types are left out of
+# anonymous searches
+SEARCH_SOURCES = {
+    "court": {"collection": "courts", "fields": {"name": 3.0, "amenities": 2.0, "description": 1.0},
+              "title": "name", "subtitle": "location"},
+    "team": {"collection": "teams", "fields": {"name": 3.0}, "title": "name", "subtitle": "description"},
+    "coach": {"collection": "coaches", "fields": {"specialties": 3.0, "bio": 1.0},
+              "title": "specialties", "subtitle": "bio"},
+    "user": {"collection": "users", "fields": {"username": 3.0, "full_name": 2.0},
+             "title": "username", "subtitle": "full_name", "members_only": True},
+}
+
+SEARCH_TOKEN = re.compile(r"[a-z0-9]+")
+
+def search_terms(value: Any) -> List[str]:
+    if isinstance(value, list):
+        return [term for item in value for term in search_terms(item)]
+    return SEARCH_TOKEN.findall(str(value).lower()) if value else []
+
+class SearchIndex:
+    """In-process inverted index: term -> {(type, id): weight}, with a sorted term
+    list for prefix expansion. Loaded at startup and updated by the write routes,
+    so each process sees its own writes immediately and others' at the next
+    reload (SEARCH_RELOAD_SECONDS)."""
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[Tuple[str, str], float]] = {}
+        self.terms: List[str] = []
+        self.documents: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    def __len__(self):
+        return len(self.documents)
+
+    def index(self, doc_type: str, doc: Dict[str, Any]):
+        key = (doc_type, doc["id"])
+        self.remove(key)
+        source = SEARCH_SOURCES[doc_type]
+        weights: Dict[str, float] = {}
+        for field, weight in source["fields"].items():
+            for term in search_terms(doc.get(field)):
+                weights[term] = weights.get(term, 0.0) + weight
+        title = doc.get(source["title"])
+        self.documents[key] = {
+            "type": doc_type,
+            "id": doc["id"],
+            "title": ", ".join(title) if isinstance(title, list) else title,
+            "subtitle": doc.get(source["subtitle"]),
+            "terms": list(weights)
+        }
+        for term, weight in weights.items():
+            if term not in self.postings:
+                self.postings[term] = {}
+                insort(self.terms, term)
+            self.postings[term][key] = weight
+
+    def remove(self, key: Tuple[str, str]):
+        document = self.documents.pop(key, None)
+        if document is None:
+            return
+        for term in document["terms"]:
+            posting = self.postings[term]
+            posting.pop(key, None)
+            if not posting:
+                del self.postings[term]
+                del self.terms[bisect_left(self.terms, term)]
+
+    def expand(self, prefix: str) -> List[str]:
+        start = bisect_left(self.terms, prefix)
+        matches = []
+        for term in self.terms[start:start + SEARCH_MAX_PREFIX_TERMS]:
+            if not term.startswith(prefix):
+                break
+            matches.append(term)
+        return matches
+
+    def search(self, query: str, doc_types: set) -> List[Tuple[float, Dict[str, Any]]]:
+        """Documents matching every query word, ranked by weighted tf-idf. The last
+        word also matches as a prefix so results follow the user as they type."""
+        words = search_terms(query)
+        if not words:
+            return []
+        total = max(len(self.documents), 1)
+        scores: Optional[Dict[Tuple[str, str], float]] = None
+        for position, word in enumerate(words):
+            candidates = self.expand(word) if position == len(words) - 1 else [word]
+            word_scores: Dict[Tuple[str, str], float] = {}
+            for term in candidates:
+                posting = self.postings.get(term, {})
+                idf = math.log(1 + total / len(posting)) if posting else 0.0
+                # Exact matches outrank completions of the same prefix
+                boost = 1.0 if term == word else 0.5
+                for key, weight in posting.items():
+                    if key[0] in doc_types and (scores is None or key in scores):
+                        word_scores[key] = max(word_scores.get(key, 0.0), weight * idf * boost)
+            scores = word_scores if scores is None else {
+                key: score + word_scores[key] for key, score in scores.items() if key in word_scores
+            }
+            if not scores:
+                return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [(score, self.documents[key]) for key, score in ranked]
+
+    def suggest(self, prefix: str, limit: int, doc_types: set) -> List[Dict[str, Any]]:
+        words = search_terms(prefix)
+        if not words:
+            return []
+        counts = []
+        for term in self.expand(words[-1]):
+            documents = sum(1 for key in self.postings[term] if key[0] in doc_types)
+            if documents:
+                counts.append((term, documents))
+        counts.sort(key=lambda item: (-item[1], item[0]))
+        return [{"term": term, "documents": documents} for term, documents in counts[:limit]]
+
+search_index = SearchIndex()
+
+def search_types(types: Optional[str], current_user: Optional[User]) -> set:
+    """Requested search types, defaulting to every type the caller may search"""
+    if not types:
+        return {doc_type for doc_type, source in SEARCH_SOURCES.items()
+                if current_user is not None or not source.get("members_only")}
+    doc_types = {doc_type.strip() for doc_type in types.split(",")}
+    unknown = doc_types - set(SEARCH_SOURCES)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown search types: {', '.join(sorted(unknown))}")
+    if current_user is None and any(SEARCH_SOURCES[doc_type].get("members_only") for doc_type in doc_types):
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return doc_types
+
+async def load_search_index():
+    index = SearchIndex()
+    for doc_type, source in SEARCH_SOURCES.items():
+        projection = {"_id": 0, "id": 1, source["subtitle"]: 1, source["title"]: 1}
+        projection.update({field: 1 for field in source["fields"]})
+        async for doc in db[source["collection"]].find({}, projection):
+            index.index(doc_type, doc)
+    # Swapped in whole so searches never see a half-built index
+    global search_index
+    search_index = index
+
+async def search_reload_loop():
+    while True:
+        await asyncio.sleep(SEARCH_RELOAD_SECONDS)
+        try:
+            await load_search_index()
+        except PyMongoError as e:
+            logger.error(f"Search index reload failed: {e}")
+
+# Background Jobs
+# Jobs are documents in the jobs collection: pending until a worker claims one with
+# a lease, then done, or back to pending with exponential backoff when the handler
+# raises, until max_attempts is reached and the job is left as failed. A worker that
+# dies mid-job lets its lease expire and the job is claimed again, so delivery is
+# at least once; running jobs renew their lease, so only a dead worker's job expires.
+class JobType:
+    def __init__(self, handler, concurrency: int, max_attempts: int):
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+
+JOB_TYPES: Dict[str, JobType] = {}
+job_wakeups: Dict[str, asyncio.Event] = {}
+background_tasks: List[asyncio.Task] = []
+
+def job_handler(job_type: str, concurrency: int = 1, max_attempts: Optional[int] = None):
+    """Register a coroutine taking the job payload; concurrency is per worker process"""
+    def register(handler):
+        JOB_TYPES[job_type] = JobType(handler, concurrency, max_attempts or JOB_MAX_ATTEMPTS)
+        return handler
+    return register
+
+def job_wakeup(job_type: str) -> asyncio.Event:
+    if job_type not in job_wakeups:
+        job_wakeups[job_type] = asyncio.Event()
+    return job_wakeups[job_type]
+
+async def enqueue_job(job_type: str, payload: Dict[str, Any], delay_seconds: float = 0) -> str:
+    if job_type not in JOB_TYPES:
+        raise ValueError(f"Unknown job type: {job_type}")
+    now = datetime.utcnow()
+    job_id = str(uuid.uuid4())
+    await db.jobs.insert_one({
+        "id": job_id,
+        "type": job_type,
+        "payload": payload,
+        "status": "pending",
+        "attempts": 0,
+        "run_at": now + timedelta(seconds=delay_seconds),
+        "created_at": now,
+        "updated_at": now
+    })
+    # Workers in this process pick it up now instead of at their next poll
+    job_wakeup(job_type).set()
+    return job_id
+
+async def expire_job_leases(job_type: str):
+    """Fail jobs whose worker died on their last allowed attempt; claim_job skips them"""
+    now = datetime.utcnow()
+    await db.jobs.update_many(
+        {"type": job_type, "status": "running", "locked_until": {"$lt": now},
+         "attempts": {"$gte": JOB_TYPES[job_type].max_attempts}},
+        {"$set": {"status": "failed", "failed_at": now, "last_error": "lease expired", "updated_at": now},
+         "$unset": {"locked_until": ""}}
+    )
+
+async def job_lease_sweep_loop(job_types: List[str]):
+    while True:
+        for job_type in job_types:
+            try:
+                await expire_job_leases(job_type)
+            except PyMongoError as e:
+                logger.error(f"Could not expire {job_type} job leases: {e}")
+        await asyncio.sleep(JOB_LEASE_SWEEP_SECONDS)
+
+async def claim_job(job_type: str, worker_id: str) -> Optional[Dict[str, Any]]:
+    now = datetime.utcnow()
+    max_attempts = JOB_TYPES[job_type].max_attempts
+    return await db.jobs.find_one_and_update(
+        {"type": job_type, "$or": [
+            {"status": "pending", "run_at": {"$lte": now}},
+            {"status": "running", "locked_until": {"$lt": now}, "attempts": {"$lt": max_attempts}}
+        ]},
+        {"$set": {"status": "running", "worker_id": worker_id,
+                  "locked_until": now + timedelta(seconds=JOB_LEASE_SECONDS), "updated_at": now},
+         "$inc": {"attempts": 1}},
+        sort=[("run_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+async def renew_job_lease(job: Dict[str, Any]):
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS / 2)
+        try:
+            await db.jobs.update_one(
+                {"id": job["id"], "worker_id": job["worker_id"], "status": "running"},
+                {"$set": {"locked_until": datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS)}}
+            )
+        except PyMongoError as e:
+            logger.warning(f"Could not renew lease of job {job['id']}: {e}")
+
+async def run_job(job: Dict[str, Any]):
+    job_type = JOB_TYPES[job["type"]]
+    started = time.perf_counter()
+    lease = asyncio.create_task(renew_job_lease(job))
+    try:
+        await job_type.handler(job["payload"])
+    except Exception as e:
+        now = datetime.utcnow()
+        logger.error(f"Job {job['type']} {job['id']} failed on attempt {job['attempts']}: {e}")
+        if job["attempts"] >= job_type.max_attempts:
+            update = {"status": "failed", "failed_at": now}
+        else:
+            backoff = min(JOB_RETRY_BASE_SECONDS * 2 ** (job["attempts"] - 1), JOB_RETRY_MAX_SECONDS)
+            update = {"status": "pending", "run_at": now + timedelta(seconds=backoff)}
+        await db.jobs.update_one(
+            {"id": job["id"], "worker_id": job["worker_id"]},
+            {"$set": {**update, "last_error": str(e), "updated_at": now}, "$unset": {"locked_until": ""}}
+        )
+        metrics.inc("jobs_total", {"type": job["type"], "outcome": "error"})
+        return
+    finally:
+        lease.cancel()
+    now = datetime.utcnow()
+    await db.jobs.update_one(
+        {"id": job["id"], "worker_id": job["worker_id"]},
+        {"$set": {"status": "done", "finished_at": now, "updated_at": now}, "$unset": {"locked_until": ""}}
+    )
+    metrics.inc("jobs_total", {"type": job["type"], "outcome": "done"})
+    metrics.observe("job_duration_seconds", {"type": job["type"]}, time.perf_counter() - started)
+
+async def run_claimed_job(job: Dict[str, Any], slots: asyncio.Semaphore):
+    try:
+        await run_job(job)
+    except Exception as e:
+        # The job keeps its lease and is claimed again once it expires
+        logger.error(f"Could not record outcome of job {job['type']} {job['id']}: {e}")
+    finally:
+        slots.release()
+
+async def job_worker_loop(job_type: str, worker_id: str):
+    """Claim jobs of one type while a slot is free and run up to its concurrency at once"""
+    wakeup = job_wakeup(job_type)
+    slots = asyncio.Semaphore(JOB_TYPES[job_type].concurrency)
+    running: set = set()
+    try:
+        while True:
+            await slots.acquire()
+            try:
+                job = await claim_job(job_type, worker_id)
+            except PyMongoError as e:
+                logger.error(f"Could not claim {job_type} job: {e}")
+                job = None
+            if job is None:
+                slots.release()
+                wakeup.clear()
+                try:
+                    await asyncio.wait_for(wakeup.wait(), JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            task = asyncio.create_task(run_claimed_job(job, slots))
+            running.add(task)
+            task.add_done_callback(running.discard)
+    finally:
+        for task in running:
+            task.cancel()
+
+def start_job_workers(job_types: Optional[List[str]] = None) -> List[asyncio.Task]:
+    process_id = f"{os.uname().nodename}:{os.getpid()}"
+    job_types = job_types or list(JOB_TYPES)
+    tasks = [asyncio.create_task(job_worker_loop(job_type, f"{process_id}:{job_type}"))
+             for job_type in job_types]
+    tasks.append(asyncio.create_task(job_lease_sweep_loop(job_types)))
+    return tasks
+
+async def claim_game_step(game_id: str, step: str) -> bool:
+    """Mark a non-idempotent completion step as applied; False if it already was"""
+    result = await db.games.update_one(
+        {"id": game_id, "completion_steps": {"$ne": step}},
+        {"$addToSet": {"completion_steps": step}}
+    )
+    return result.modified_count == 1
+
+async def release_game_step(game_id: str, step: str):
+    await db.games.update_one({"id": game_id}, {"$pull": {"completion_steps": step}})
+
+@job_handler("game.completed", concurrency=4)
+async def handle_game_completed(payload: Dict[str, Any]):
+    """Leaderboard, ratings and bracket updates for a game that just finished"""
+    game = await db.games.find_one({"id": payload["game_id"]}, {"_id": 0})
+    if not game:
+        return
+    # The leaderboard $inc and the Elo change must not be repeated when the job is
+    # retried or reclaimed, so each is claimed on the game first and released again
+    # if it raises; the bracket update is guarded on its own
+    if await claim_game_step(game["id"], "leaderboard"):
+        try:
+            await record_game_result(game, game.get("actual_end_time") or datetime.utcnow())
+        except Exception:
+            await release_game_step(game["id"], "leaderboard")
+            raise
+    if await claim_game_step(game["id"], "rating"):
+        try:
+            ratings = await record_game_rating(game)
+        except Exception:
+            await release_game_step(game["id"], "rating")
+            raise
+        for user_id, rating in ratings.items():
+            matchmaking_index.rerate(user_id, rating)
+    if game.get("tournament_id"):
+        await advance_bracket(game)
+
+@job_handler("booking.created", concurrency=4)
+async def handle_booking_created(payload: Dict[str, Any]):
+    booking = await db.bookings.find_one({"id": payload["booking_id"]}, {"_id": 0})
+    if booking:
+        await mark_court_occupancy(booking["court_id"], booking["start_time"], booking["end_time"])
+
+@job_handler("booking.checked_in", concurrency=2)
+async def handle_booking_checked_in(payload: Dict[str, Any]):
+    # check_in now writes directly; kept so jobs queued by older processes still run.
+    # Only the first scan of a booking is recorded
+    await db.bookings.update_one(
+        {"id": payload["booking_id"], "checked_in_at": None},
+        {"$set": {"checked_in_at": payload["checked_in_at"]}}
+    )
+
+@job_handler("coach.created", concurrency=2)
+async def handle_coach_created(payload: Dict[str, Any]):
+    await db.users.update_one({"id": payload["user_id"]}, {"$set": {"is_coach": True}})
+    user_cache.invalidate(payload["user_id"])
+
+@job_handler("ratings.recompute", max_attempts=1)
+async def handle_ratings_recompute(payload: Dict[str, Any]):
+    players = await recompute_ratings()
+    logger.info(f"Ratings recomputed for {players} players")
+
 # Authentication Routes
 @api_router.post("/auth/register", response_model=Dict[str, str])
 async def register(user_data: UserCreate):
@@ -306,13 +2498,17 @@ async def register(user_data: UserCreate):
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Create new user
-    hashed_password = hash_password(user_data.password)
+    hashed_password = await hash_password_async(user_data.password)
     user_dict = user_data.dict()
     user_dict.pop("password")
     user_dict["password_hash"] = hashed_password
     user_obj = User(**user_dict)
     
-    await db.users.insert_one(user_obj.dict())
+    try:
+        await db.users.insert_one(user_obj.dict())
+        search_index.index("user", user_obj.dict())
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
     
     # Create access token
     access_token = create_access_token(data={"sub": user_obj.id})
@@ -328,14 +2524,15 @@ async def login(login_data: UserLogin):
     # Check if password_hash exists in the user document
     if "password_hash" not in user:
         # For testing purposes, create a hash for the user
-        hashed_password = hash_password(login_data.password)
+        hashed_password = await hash_password_async(login_data.password)
         await db.users.update_one(
             {"email": login_data.email},
             {"$set": {"password_hash": hashed_password}}
         )
+        user_cache.invalidate(user["id"])
         user = await db.users.find_one({"email": login_data.email})
     
-    if not verify_password(login_data.password, user["password_hash"]):
+    if not await verify_password_async(login_data.password, user["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
     access_token = create_access_token(data={"sub": user["id"]})
@@ -351,28 +2548,202 @@ async def get_current_user_profile(current_user: User = Depends(get_current_user
 async def update_user_profile(user_data: dict, current_user: User = Depends(get_current_user)):
     user_data["updated_at"] = datetime.utcnow()
     await db.users.update_one({"id": current_user.id}, {"$set": user_data})
+    user_cache.invalidate(current_user.id)
     
     updated_user = await db.users.find_one({"id": current_user.id})
+    search_index.index("user", updated_user)
     return UserResponse(**updated_user)
 
 # Court Routes
 @api_router.get("/courts", response_model=List[Court])
-async def get_courts():
-    courts = await db.courts.find().to_list(1000)
-    return [Court(**court) for court in courts]
+async def get_courts(
+    court_type: Optional[str] = None,
+    surface_type: Optional[str] = None,
+    is_available: Optional[bool] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    query: Dict[str, Any] = {}
+    if court_type:
+        query["court_type"] = court_type
+    if surface_type:
+        query["surface_type"] = surface_type
+    if is_available is not None:
+        query["is_available"] = is_available
+    
+    projection = parse_fields(fields, Court)
+    courts, next_cursor = await fetch_page(read_database("courts").courts, query, limit, after, projection)
+    return page_response(Court, courts, next_cursor, projection)
+
+@api_router.get("/courts/availability")
+async def get_court_availability(
+    start_date: str,
+    end_date: Optional[str] = None,
+    duration_minutes: int = Query(60, ge=BOOKING_SLOT_MINUTES, le=24 * 60),
+    from_time: str = "00:00",
+    to_time: str = "24:00",
+    court_type: Optional[str] = None
+):
+    try:
+        first_day = datetime.strptime(start_date, "%Y-%m-%d")
+        last_day = datetime.strptime(end_date, "%Y-%m-%d") if end_date else first_day
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must use YYYY-MM-DD format")
+    day_count = (last_day - first_day).days + 1
+    if day_count < 1 or day_count > AVAILABILITY_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range must cover 1 to {AVAILABILITY_MAX_DAYS} days")
+    window_start, window_end = parse_slot_of_day(from_time), parse_slot_of_day(to_time)
+    slots_needed = -(-duration_minutes // BOOKING_SLOT_MINUTES)
+    
+    court_query: Dict[str, Any] = {"is_available": True}
+    if court_type:
+        court_query["court_type"] = court_type
+    courts = await db.courts.find(court_query, {"_id": 0, "id": 1, "name": 1}).to_list(None)
+    days = [(first_day + timedelta(days=offset)).strftime("%Y-%m-%d") for offset in range(day_count)]
+    court_index = {court["id"]: position for position, court in enumerate(courts)}
+    day_index = {day: position for position, day in enumerate(days)}
+    
+    # One query for every bitmap in range, then a (courts x days x 2) word grid
+    words = np.zeros((len(courts), day_count, 2), dtype=np.uint64)
+    cursor = db.court_occupancy.find(
+        {"day": {"$gte": days[0], "$lte": days[-1]}, "court_id": {"$in": list(court_index)}},
+        {"_id": 0, "court_id": 1, "day": 1, "am": 1, "pm": 1}
+    )
+    async for doc in cursor:
+        words[court_index[doc["court_id"]], day_index[doc["day"]]] = [doc.get("am", 0), doc.get("pm", 0)]
+    
+    free = ~occupancy_bits(words)
+    free[..., :window_start] = False
+    free[..., window_end:] = False
+    
+    fits = slot_fits(free, slots_needed)
+    
+    # Collapse runs of feasible start slots into open windows
+    edges = np.diff(np.concatenate([
+        np.zeros((*fits.shape[:-1], 1), dtype=np.int8),
+        fits.astype(np.int8),
+        np.zeros((*fits.shape[:-1], 1), dtype=np.int8)
+    ], axis=-1), axis=-1)
+    results = []
+    for court_position, court in enumerate(courts):
+        open_slots = []
+        for day_position in np.flatnonzero(fits[court_position].any(axis=-1)):
+            starts = np.flatnonzero(edges[court_position, day_position] == 1)
+            ends = np.flatnonzero(edges[court_position, day_position] == -1)
+            for run_start, run_end in zip(starts, ends):
+                open_slots.append({
+                    "date": days[day_position],
+                    "start": slot_clock(int(run_start)),
+                    "end": slot_clock(int(run_end) - 1 + slots_needed)
+                })
+        if open_slots:
+            results.append({"court_id": court["id"], "name": court["name"], "open_slots": open_slots})
+    
+    return {
+        "start_date": days[0],
+        "end_date": days[-1],
+        "duration_minutes": duration_minutes,
+        "courts": results
+    }
 
 @api_router.post("/courts", response_model=Court)
 async def create_court(court_data: CourtCreate, current_user: User = Depends(get_current_user)):
-    court_obj = Court(**court_data.dict())
+    court_dict = court_data.dict(exclude={"latitude", "longitude"})
+    if (court_data.latitude is None) != (court_data.longitude is None):
+        raise HTTPException(status_code=400, detail="Provide both latitude and longitude, or neither")
+    if court_data.latitude is not None:
+        court_dict["coordinates"] = GeoPoint(coordinates=[court_data.longitude, court_data.latitude])
+    
+    court_obj = Court(**court_dict)
     await db.courts.insert_one(court_obj.dict())
+    search_index.index("court", court_obj.dict())
+    await invalidate_response_cache("courts")
     return court_obj
 
+@api_router.get("/courts/nearby", response_model=List[NearbyCourt])
+async def get_nearby_courts(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius: float = Query(10, gt=0, le=500),  # kilometers
+    court_type: Optional[str] = None,
+    surface_type: Optional[str] = None,
+    amenities: Optional[str] = None,  # comma-separated, all must be present
+    is_available: Optional[bool] = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE)
+):
+    query: Dict[str, Any] = {}
+    if court_type:
+        query["court_type"] = court_type
+    if surface_type:
+        query["surface_type"] = surface_type
+    if amenities:
+        query["amenities"] = {"$all": [amenity.strip() for amenity in amenities.split(",") if amenity.strip()]}
+    if is_available is not None:
+        query["is_available"] = is_available
+    
+    # $geoNear uses the 2dsphere index and returns courts nearest first
+    courts = await db.courts.aggregate([
+        {"$geoNear": {
+            "near": {"type": "Point", "coordinates": [lng, lat]},
+            "distanceField": "distance_km",
+            "distanceMultiplier": 0.001,
+            "maxDistance": radius * 1000,
+            "spherical": True,
+            "query": query
+        }},
+        {"$limit": limit},
+        {"$project": {"_id": 0}}
+    ]).to_list(None)
+    return fast_json_response(trusted_documents(NearbyCourt, courts))
+
 @api_router.get("/courts/{court_id}", response_model=Court)
 async def get_court(court_id: str):
-    court = await db.courts.find_one({"id": court_id})
+    court = await db.courts.find_one({"id": court_id}, {"_id": 0})
     if not court:
         raise HTTPException(status_code=404, detail="Court not found")
-    return Court(**court)
+    return fast_json_response(trusted_documents(Court, [court])[0])
+
+@api_router.post("/courts/{court_id}/check-in")
+async def check_in(court_id: str, check_in_data: CheckInRequest, request: Request):
+    if not CHECKIN_GATE_KEYS:
+        raise HTTPException(status_code=503, detail="Gate check-in is not configured")
+    if request.headers.get("X-Gate-Key") not in CHECKIN_GATE_KEYS:
+        raise HTTPException(status_code=401, detail="Unknown gate key")
+    
+    now = check_in_clock()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if check_in_index.day != today:
+        await load_check_in_index(today)
+    
+    rfid_code = check_in_data.rfid_code.strip().upper()
+    booking = check_in_index.lookup(court_id, rfid_code, now)
+    if booking is None:
+        booking = await db.bookings.find_one({
+            "court_id": court_id,
+            "rfid_code": rfid_code,
+            "start_time": {"$lte": now + timedelta(minutes=CHECKIN_EARLY_MINUTES)},
+            "end_time": {"$gt": now},
+            "status": {"$in": CHECK_IN_STATUSES}
+        }, CHECK_IN_PROJECTION)
+        if booking is None:
+            raise HTTPException(status_code=403, detail="No booking for this code on this court right now")
+        check_in_index.add(booking)
+    
+    # Repeat scans of a booking already recorded here skip the write entirely; the
+    # guard keeps the first scan when another process recorded one meanwhile
+    if booking.get("checked_in_at") is None:
+        booking["checked_in_at"] = now
+        await db.bookings.update_one(
+            {"id": booking["id"], "checked_in_at": None},
+            {"$set": {"checked_in_at": now}}
+        )
+    return {
+        "allowed": True,
+        "booking_id": booking["id"],
+        "start_time": booking["start_time"],
+        "end_time": booking["end_time"]
+    }
 
 # Booking Routes
 @api_router.post("/bookings", response_model=Booking)
@@ -391,9 +2762,20 @@ async def create_booking(booking_data: BookingCreate, current_user: User = Depen
     booking_dict["total_cost"] = total_cost
     
     # Parse date and time
+    if booking_data.duration_hours <= 0:
+        raise HTTPException(status_code=400, detail="Duration must be at least one hour")
     date_str = booking_data.date
     time_str = booking_data.start_time
-    start_datetime = datetime.fromisoformat(f"{date_str}T{time_str}")
+    try:
+        start_datetime = datetime.fromisoformat(f"{date_str}T{time_str}")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid booking date or start time")
+    # Bookings claim whole reservation slots, so they must start on a slot boundary
+    if start_datetime.second or start_datetime.microsecond or start_datetime.minute % BOOKING_SLOT_MINUTES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Start time must be on a {BOOKING_SLOT_MINUTES}-minute boundary"
+        )
     end_datetime = start_datetime + timedelta(hours=booking_data.duration_hours)
     
     booking_dict["date"] = start_datetime
@@ -401,20 +2783,55 @@ async def create_booking(booking_data: BookingCreate, current_user: User = Depen
     booking_dict["end_time"] = end_datetime
     
     booking_obj = Booking(**booking_dict)
-    await db.bookings.insert_one(booking_obj.dict())
+    
+    # Bookings made before slot claims existed are only visible through the interval query
+    if await find_overlapping_booking(booking_obj.court_id, start_datetime, end_datetime):
+        raise HTTPException(status_code=409, detail="Court is already booked for this time")
+    await reserve_court_slots(booking_obj.court_id, start_datetime, end_datetime, booking_obj.id)
+    try:
+        await db.bookings.insert_one(booking_obj.dict())
+    except PyMongoError:
+        await release_court_slots(booking_obj.id)
+        raise
+    await enqueue_job("booking.created", {"booking_id": booking_obj.id})
+    check_in_index.add(booking_obj.dict())
     
     return booking_obj
 
 @api_router.get("/bookings/me", response_model=List[Booking])
-async def get_my_bookings(current_user: User = Depends(get_current_user)):
-    bookings = await db.bookings.find({"user_id": current_user.id}).to_list(1000)
-    return [Booking(**booking) for booking in bookings]
+async def get_my_bookings(
+    status: Optional[BookingStatus] = None,
+    court_id: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    query: Dict[str, Any] = {"user_id": current_user.id}
+    if status:
+        query["status"] = status.value
+    if court_id:
+        query["court_id"] = court_id
+    
+    projection = parse_fields(fields, Booking)
+    bookings, next_cursor = await fetch_page(db.bookings, query, limit, after, projection)
+    return page_response(Booking, bookings, next_cursor, projection)
 
 # Tournament Routes
 @api_router.get("/tournaments", response_model=List[Tournament])
-async def get_tournaments():
-    tournaments = await db.tournaments.find().to_list(1000)
-    return [Tournament(**tournament) for tournament in tournaments]
+async def get_tournaments(
+    status: Optional[TournamentStatus] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    query: Dict[str, Any] = {}
+    if status:
+        query["status"] = status.value
+    
+    projection = parse_fields(fields, Tournament)
+    tournaments, next_cursor = await fetch_page(read_database("tournaments").tournaments, query, limit, after, projection)
+    return page_response(Tournament, tournaments, next_cursor, projection)
 
 @api_router.post("/tournaments", response_model=Tournament)
 async def create_tournament(tournament_data: TournamentCreate, current_user: User = Depends(get_current_user)):
@@ -425,36 +2842,108 @@ async def create_tournament(tournament_data: TournamentCreate, current_user: Use
     
     tournament_obj = Tournament(**tournament_dict)
     await db.tournaments.insert_one(tournament_obj.dict())
+    await invalidate_response_cache("tournaments")
     
     return tournament_obj
 
-@api_router.post("/tournaments/{tournament_id}/register")
-async def register_for_tournament(tournament_id: str, current_user: User = Depends(get_current_user)):
+# Status changes a creator may make; brackets are built once, on upcoming -> active
+TOURNAMENT_TRANSITIONS = {
+    TournamentStatus.UPCOMING.value: {TournamentStatus.ACTIVE.value, TournamentStatus.CANCELLED.value},
+    TournamentStatus.ACTIVE.value: {TournamentStatus.COMPLETED.value, TournamentStatus.CANCELLED.value},
+}
+
+@api_router.put("/tournaments/{tournament_id}/status", response_model=Tournament)
+async def update_tournament_status(
+    tournament_id: str,
+    status_data: TournamentStatusUpdate,
+    current_user: User = Depends(get_current_user)
+):
     tournament = await db.tournaments.find_one({"id": tournament_id})
     if not tournament:
         raise HTTPException(status_code=404, detail="Tournament not found")
+    if tournament["created_by"] != current_user.id:
+        raise HTTPException(status_code=403, detail="Only the tournament creator can change its status")
     
-    if current_user.id in tournament["participants"]:
-        raise HTTPException(status_code=400, detail="Already registered for this tournament")
+    if status_data.status.value not in TOURNAMENT_TRANSITIONS.get(tournament["status"], set()):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Cannot change a tournament from {TournamentStatus(tournament['status']).value} to {status_data.status.value}"
+        )
     
-    if tournament["current_participants"] >= tournament["max_participants"]:
-        raise HTTPException(status_code=400, detail="Tournament is full")
+    update: Dict[str, Any] = {"status": status_data.status.value}
+    # The participant count in the filter turns a sign-up landing while the bracket is
+    # generated into a 409, instead of a registered player missing from the bracket
+    query: Dict[str, Any] = {
+        "id": tournament_id,
+        "status": tournament["status"],
+        "current_participants": tournament["current_participants"]
+    }
+    if status_data.status == TournamentStatus.ACTIVE:
+        if len(tournament["participants"]) < 2:
+            raise HTTPException(status_code=400, detail="At least two participants are needed to start")
+        update["bracket"] = await generate_bracket(tournament)
     
-    await db.tournaments.update_one(
-        {"id": tournament_id},
+    updated = await db.tournaments.find_one_and_update(
+        query,
+        {"$set": update},
+        return_document=ReturnDocument.AFTER
+    )
+    if not updated:
+        raise HTTPException(status_code=409, detail="Tournament status changed concurrently, please retry")
+    await invalidate_response_cache("tournaments")
+    
+    return Tournament(**updated)
+
+@api_router.post("/tournaments/{tournament_id}/register")
+async def register_for_tournament(tournament_id: str, current_user: User = Depends(get_current_user)):
+    # Membership and capacity are checked in the filter so concurrent sign-ups cannot overfill
+    result = await db.tournaments.update_one(
+        {
+            "id": tournament_id,
+            "status": TournamentStatus.UPCOMING.value,
+            "participants": {"$ne": current_user.id},
+            "$expr": {"$lt": ["$current_participants", "$max_participants"]}
+        },
         {
             "$push": {"participants": current_user.id},
             "$inc": {"current_participants": 1}
         }
     )
     
+    if result.matched_count == 0:
+        tournament = await db.tournaments.find_one({"id": tournament_id}, {"_id": 0, "participants": 1, "status": 1})
+        if not tournament:
+            raise HTTPException(status_code=404, detail="Tournament not found")
+        if current_user.id in tournament["participants"]:
+            raise HTTPException(status_code=400, detail="Already registered for this tournament")
+        if tournament["status"] != TournamentStatus.UPCOMING.value:
+            raise HTTPException(status_code=400, detail="Registration is closed for this tournament")
+        raise HTTPException(status_code=400, detail="Tournament is full")
+    await invalidate_response_cache("tournaments")
+    
     return {"message": "Successfully registered for tournament"}
 
 # Challenge Routes
 @api_router.get("/challenges", response_model=List[Challenge])
-async def get_challenges():
-    challenges = await db.challenges.find().to_list(1000)
-    return [Challenge(**challenge) for challenge in challenges]
+async def get_challenges(
+    status: Optional[ChallengeStatus] = None,
+    court_id: Optional[str] = None,
+    created_by: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    query: Dict[str, Any] = {}
+    if status:
+        query["status"] = status.value
+    if court_id:
+        query["court_id"] = court_id
+    if created_by:
+        query["created_by"] = created_by
+    
+    projection = parse_fields(fields, Challenge)
+    challenges, next_cursor = await fetch_page(db.challenges, query, limit, after, projection)
+    return page_response(Challenge, challenges, next_cursor, projection)
 
 @api_router.post("/challenges", response_model=Challenge)
 async def create_challenge(challenge_data: ChallengeCreate, current_user: User = Depends(get_current_user)):
@@ -462,34 +2951,72 @@ async def create_challenge(challenge_data: ChallengeCreate, current_user: User =
     challenge_dict["created_by"] = current_user.id
     
     if challenge_data.scheduled_date:
-        challenge_dict["scheduled_date"] = datetime.fromisoformat(challenge_data.scheduled_date)
+        challenge_dict["scheduled_date"] = naive_utc(datetime.fromisoformat(challenge_data.scheduled_date))
     
     challenge_obj = Challenge(**challenge_dict)
     await db.challenges.insert_one(challenge_obj.dict())
+    ratings = await skill_ratings([current_user.id])
+    matchmaking_index.add(challenge_obj.dict(), ratings[current_user.id])
     
     return challenge_obj
 
+@api_router.get("/challenges/matches", response_model=List[ChallengeMatch])
+async def find_challenge_matches(
+    court_id: Optional[str] = None,
+    scheduled_date: Optional[str] = None,  # ISO format, defaults to now
+    limit: int = Query(10, ge=1, le=100),
+    current_user: User = Depends(get_current_user)
+):
+    """Open challenges closest to the caller's rating, preferred court and time"""
+    try:
+        moment = naive_utc(datetime.fromisoformat(scheduled_date)) if scheduled_date else datetime.utcnow()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid scheduled_date")
+    
+    rating = (await skill_ratings([current_user.id]))[current_user.id]
+    matches = await verified_matches(current_user.id, rating, moment, court_id, limit)
+    return [
+        ChallengeMatch(
+            challenge=Challenge(**challenge),
+            creator_rating=round(creator_rating, 1),
+            match_score=round(score, 3)
+        )
+        for score, challenge, creator_rating in matches
+    ]
+
 @api_router.post("/challenges/{challenge_id}/accept")
 async def accept_challenge(challenge_id: str, current_user: User = Depends(get_current_user)):
-    challenge = await db.challenges.find_one({"id": challenge_id})
+    # The status guard makes acceptance atomic: only one caller can take an open challenge
+    challenge = await db.challenges.find_one_and_update(
+        {"id": challenge_id, "status": ChallengeStatus.OPEN.value,
+         "challenged_user": {"$in": [None, current_user.id]}},
+        {"$set": {"challenged_user": current_user.id, "status": ChallengeStatus.ACCEPTED.value}}
+    )
     if not challenge:
-        raise HTTPException(status_code=404, detail="Challenge not found")
-    
-    if challenge["status"] != "open":
+        if not await db.challenges.find_one({"id": challenge_id}, {"_id": 1}):
+            raise HTTPException(status_code=404, detail="Challenge not found")
         raise HTTPException(status_code=400, detail="Challenge is not open")
-    
-    await db.challenges.update_one(
-        {"id": challenge_id},
-        {"$set": {"challenged_user": current_user.id, "status": "accepted"}}
-    )
+    matchmaking_index.remove(challenge_id)
     
     return {"message": "Challenge accepted"}
 
 # Team Routes
 @api_router.get("/teams", response_model=List[Team])
-async def get_teams():
-    teams = await db.teams.find().to_list(1000)
-    return [Team(**team) for team in teams]
+async def get_teams(
+    is_active: Optional[bool] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    query: Dict[str, Any] = {}
+    if is_active is not None:
+        query["is_active"] = is_active
+    
+    projection = parse_fields(fields, Team)
+    teams, next_cursor = await fetch_page(db.teams, query, limit, after, projection)
+    return page_response(Team, teams, next_cursor, projection)
+
+REFERRAL_CODE_ATTEMPTS = 5
 
 @api_router.post("/teams", response_model=Team)
 async def create_team(team_data: TeamCreate, current_user: User = Depends(get_current_user)):
@@ -498,53 +3025,72 @@ async def create_team(team_data: TeamCreate, current_user: User = Depends(get_cu
     team_dict["members"] = [current_user.id]
     
     team_obj = Team(**team_dict)
-    await db.teams.insert_one(team_obj.dict())
+    # Referral codes are short, so a rare collision just draws a new one
+    for attempt in range(REFERRAL_CODE_ATTEMPTS):
+        try:
+            await db.teams.insert_one(team_obj.dict())
+            break
+        except DuplicateKeyError:
+            if attempt == REFERRAL_CODE_ATTEMPTS - 1:
+                raise
+            team_obj.referral_code = new_referral_code()
+    search_index.index("team", team_obj.dict())
+    await invalidate_response_cache("teams")
     
     return team_obj
 
-@api_router.post("/teams/{team_id}/join")
-async def join_team(team_id: str, current_user: User = Depends(get_current_user)):
-    team = await db.teams.find_one({"id": team_id})
-    if not team:
-        raise HTTPException(status_code=404, detail="Team not found")
+async def add_team_member(team_query: Dict[str, Any], user_id: str, not_found_detail: str):
+    """Add a member in one conditional update; the filter guards membership and capacity"""
+    team = await db.teams.find_one_and_update(
+        {
+            **team_query,
+            "members": {"$ne": user_id},
+            "$expr": {"$lt": [{"$size": "$members"}, "$max_members"]}
+        },
+        {"$push": {"members": user_id}},
+        projection={"_id": 0, "id": 1, "name": 1}
+    )
+    if team:
+        await invalidate_response_cache("teams")
+        return team
     
-    if current_user.id in team["members"]:
+    team = await db.teams.find_one(team_query, {"_id": 0, "members": 1})
+    if not team:
+        raise HTTPException(status_code=404, detail=not_found_detail)
+    if user_id in team["members"]:
         raise HTTPException(status_code=400, detail="Already a member of this team")
-    
-    if len(team["members"]) >= team["max_members"]:
-        raise HTTPException(status_code=400, detail="Team is full")
-    
-    await db.teams.update_one(
-        {"id": team_id},
-        {"$push": {"members": current_user.id}}
-    )
+    raise HTTPException(status_code=400, detail="Team is full")
+
+@api_router.post("/teams/{team_id}/join")
+async def join_team(team_id: str, current_user: User = Depends(get_current_user)):
+    await add_team_member({"id": team_id}, current_user.id, "Team not found")
     
     return {"message": "Successfully joined team"}
 
 @api_router.post("/teams/join-by-code")
 async def join_team_by_code(referral_code: str, current_user: User = Depends(get_current_user)):
-    team = await db.teams.find_one({"referral_code": referral_code})
-    if not team:
-        raise HTTPException(status_code=404, detail="Invalid referral code")
-    
-    if current_user.id in team["members"]:
-        raise HTTPException(status_code=400, detail="Already a member of this team")
-    
-    if len(team["members"]) >= team["max_members"]:
-        raise HTTPException(status_code=400, detail="Team is full")
-    
-    await db.teams.update_one(
-        {"referral_code": referral_code},
-        {"$push": {"members": current_user.id}}
-    )
+    team = await add_team_member({"referral_code": referral_code}, current_user.id, "Invalid referral code")
     
     return {"message": "Successfully joined team", "team_name": team["name"]}
 
 # Coach Routes
 @api_router.get("/coaches", response_model=List[Coach])
-async def get_coaches():
-    coaches = await db.coaches.find().to_list(1000)
-    return [Coach(**coach) for coach in coaches]
+async def get_coaches(
+    specialty: Optional[str] = None,
+    is_available: Optional[bool] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    query: Dict[str, Any] = {}
+    if specialty:
+        query["specialties"] = specialty
+    if is_available is not None:
+        query["is_available"] = is_available
+    
+    projection = parse_fields(fields, Coach)
+    coaches, next_cursor = await fetch_page(read_database("coaches").coaches, query, limit, after, projection)
+    return page_response(Coach, coaches, next_cursor, projection)
 
 @api_router.post("/coaches", response_model=Coach)
 async def create_coach_profile(coach_data: CoachCreate, current_user: User = Depends(get_current_user)):
@@ -557,10 +3103,15 @@ async def create_coach_profile(coach_data: CoachCreate, current_user: User = Dep
     coach_dict["user_id"] = current_user.id
     
     coach_obj = Coach(**coach_dict)
-    await db.coaches.insert_one(coach_obj.dict())
+    try:
+        await db.coaches.insert_one(coach_obj.dict())
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Coach profile already exists")
+    search_index.index("coach", coach_obj.dict())
+    await invalidate_response_cache("coaches")
     
-    # Update user to mark as coach
-    await db.users.update_one({"id": current_user.id}, {"$set": {"is_coach": True}})
+    # Marking the user as a coach happens off the request path
+    await enqueue_job("coach.created", {"user_id": current_user.id})
     
     return coach_obj
 
@@ -579,38 +3130,394 @@ async def create_game(game_data: dict, current_user: User = Depends(get_current_
 
 @api_router.put("/games/{game_id}/score")
 async def update_game_score(game_id: str, score_data: dict, current_user: User = Depends(get_current_user)):
-    game = await db.games.find_one({"id": game_id})
-    if not game:
-        raise HTTPException(status_code=404, detail="Game not found")
-    
-    await db.games.update_one(
+    update = {
+        "score": score_data["score"],
+        "status": score_data.get("status", "in_progress"),
+        "winner": score_data.get("winner"),
+        "stats": score_data.get("stats", {})
+    }
+    previous = await db.games.find_one_and_update(
         {"id": game_id},
-        {"$set": {
-            "score": score_data["score"],
-            "status": score_data.get("status", "in_progress"),
-            "winner": score_data.get("winner"),
-            "stats": score_data.get("stats", {})
-        }}
+        {"$set": update},
+        return_document=ReturnDocument.BEFORE
     )
+    if not previous:
+        raise HTTPException(status_code=404, detail="Game not found")
+    
+    score_hub.publish_game({**previous, **update})
+    
+    # Only the transition into "completed" counts towards the leaderboard; a reopened
+    # game keeps its first end time so the stat rollups never take it twice
+    if update["status"] == "completed" and previous.get("status") != "completed":
+        await db.games.update_one({"id": game_id, "actual_end_time": None},
+                                  {"$set": {"actual_end_time": datetime.utcnow()}})
+        await enqueue_job("game.completed", {"game_id": game_id})
     
     return {"message": "Score updated successfully"}
 
+SCORE_EVENT_KEY = re.compile(r"^[^.$][^.]*$")
+
+@api_router.post("/games/score-events")
+async def ingest_score_events(batch: ScoreEventBatch, current_user: User = Depends(get_current_user)):
+    if len(batch.events) > SCORE_EVENTS_MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {SCORE_EVENTS_MAX_BATCH} events per batch")
+    
+    for event in batch.events:
+        keys = [event.player_id, *event.stats]
+        if not all(SCORE_EVENT_KEY.match(key) for key in keys):
+            raise HTTPException(status_code=400, detail=f"Invalid player or stat name in event {event.event_id}")
+    
+    game_ids = list({event.game_id for event in batch.events})
+    known_games = {game["id"] async for game in db.games.find({"id": {"$in": game_ids}}, {"_id": 0, "id": 1})}
+    
+    # The event id guard and the increments are one atomic update per event, so a
+    # redelivered event is a no-op and a failed write can simply be retried; the
+    # $push always modifies the game, so even a 0-point event counts as applied
+    operations = []
+    for event in batch.events:
+        if event.game_id not in known_games:
+            continue
+        increments = {f"score.{event.player_id}": event.points}
+        increments.update({f"stats.{event.player_id}.{stat}": amount for stat, amount in event.stats.items()})
+        operations.append(UpdateOne(
+            {"id": event.game_id, "recent_score_events": {"$ne": event.event_id}},
+            {"$inc": increments,
+             "$push": {"recent_score_events": {"$each": [event.event_id], "$slice": -SCORE_EVENT_DEDUP_WINDOW}}}
+        ))
+    
+    applied = 0
+    if operations:
+        result = await db.games.bulk_write(operations, ordered=False)
+        applied = result.modified_count
+    
+    if applied and score_hub.has_subscribers():
+        async for game in db.games.find({"id": {"$in": game_ids}}, LIVE_GAME_PROJECTION):
+            score_hub.publish_game(game)
+    
+    return {
+        "received": len(batch.events),
+        "applied": applied,
+        "skipped": len(operations) - applied,
+        "unknown_game": len(batch.events) - len(operations)
+    }
+
+@api_router.post("/games/{game_id}/plays")
+async def append_plays(game_id: str, batch: PlayBatch, current_user: User = Depends(get_current_user)):
+    if not batch.events or len(batch.events) > PLAY_EVENTS_MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"Send 1 to {PLAY_EVENTS_MAX_BATCH} plays per batch")
+    
+    # Reserve a block of sequence numbers so concurrent scorers never interleave a batch;
+    # a batch id the game already lists keeps the block it reserved the first time
+    projection = {"play_count": 1, "play_batches": 1}
+    game = await db.games.find_one_and_update(
+        {"id": game_id, "play_batches.id": {"$ne": batch.batch_id}},
+        {"$inc": {"play_count": len(batch.events)},
+         "$push": {"play_batches": {"$each": [{"id": batch.batch_id, "size": len(batch.events)}],
+                                    "$slice": -PLAY_BATCH_DEDUP_WINDOW}}},
+        projection=projection,
+        return_document=ReturnDocument.AFTER
+    )
+    if not game:
+        game = await db.games.find_one({"id": game_id}, projection)
+        if not game:
+            raise HTTPException(status_code=404, detail="Game not found")
+    seq_range = batch_seq_range(game, batch.batch_id)
+    if seq_range is None or seq_range[1] - seq_range[0] + 1 != len(batch.events):
+        raise HTTPException(status_code=409, detail=f"Batch {batch.batch_id} was already sent with a different number of plays")
+    first_seq, last_seq = seq_range
+    
+    plays = [Play(**event.dict(), game_id=game_id, seq=first_seq + offset)
+             for offset, event in enumerate(batch.events)]
+    try:
+        await db.plays.insert_many([compact_play(play) for play in plays], ordered=False)
+    except BulkWriteError as e:
+        # Plays a retried batch already stored are kept as they are
+        if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+            raise
+    
+    # Fold the batch into one $inc per player instead of one write per play
+    rollups: Dict[str, Dict[str, int]] = {}
+    for play in plays:
+        row = rollups.setdefault(play.player_id, {})
+        for stat, amount in box_score_increments(play).items():
+            row[stat] = row.get(stat, 0) + amount
+    now = datetime.utcnow()
+    updates = {
+        player_id: {"$inc": increments, "$set": {"updated_at": now},
+                    "$push": {"rolled_up_batches": {"$each": [batch.batch_id],
+                                                    "$slice": -PLAY_BATCH_DEDUP_WINDOW}}}
+        for player_id, increments in rollups.items()
+    }
+    def rollup_ops(player_ids, upsert):
+        return [UpdateOne({"game_id": game_id, "player_id": player_id,
+                           "rolled_up_batches": {"$ne": batch.batch_id}},
+                          updates[player_id], upsert=upsert)
+                for player_id in player_ids]
+    player_ids = list(updates)
+    try:
+        await db.box_scores.bulk_write(rollup_ops(player_ids, True), ordered=False)
+    except BulkWriteError as e:
+        # An upsert collides with the unique index when the row exists but already
+        # holds this batch, or when another batch created it first; the plain
+        # update applies the batch in the second case only
+        if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+            raise
+        retry = [player_ids[error["index"]] for error in e.details["writeErrors"]]
+        await db.box_scores.bulk_write(rollup_ops(retry, False), ordered=False)
+    
+    return {"batch_id": batch.batch_id, "first_seq": first_seq, "last_seq": last_seq}
+
+@api_router.get("/games/{game_id}/plays")
+async def stream_game_plays(game_id: str, after_seq: int = Query(0, ge=0)):
+    """Replay a game's plays in order as NDJSON; pass after_seq to resume"""
+    if not await db.games.find_one({"id": game_id}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Game not found")
+    cursor = db.plays.find(
+        {"g": game_id, "s": {"$gt": after_seq}},
+        {"_id": 0}
+    ).sort("s", 1).batch_size(EXPORT_BATCH_SIZE)
+    
+    return StreamingResponse(ndjson_lines(cursor, expand_play), media_type="application/x-ndjson")
+
+@api_router.get("/games/{game_id}/box-score")
+async def get_box_score(game_id: str):
+    rows = await db.box_scores.find({"game_id": game_id}, {"_id": 0, "rolled_up_batches": 0}).to_list(None)
+    if not rows and not await db.games.find_one({"id": game_id}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Game not found")
+    
+    players = [{**row, **shooting_splits(row)} for row in rows]
+    players.sort(key=lambda row: (-row.get("pts", 0), row["player_id"]))
+    return {"game_id": game_id, "players": players}
+
+@api_router.websocket("/ws/games/{game_id}")
+async def live_game_scores(websocket: WebSocket, game_id: str):
+    game = await db.games.find_one({"id": game_id}, LIVE_GAME_PROJECTION)
+    if not game:
+        await websocket.close(code=1008)
+        return
+    await stream_live_scores(websocket, f"game:{game_id}", [game])
+
+@api_router.websocket("/ws/courts/{court_id}")
+async def live_court_scores(websocket: WebSocket, court_id: str):
+    games = await db.games.find(
+        {"court_id": court_id, "status": "in_progress"},
+        LIVE_GAME_PROJECTION
+    ).to_list(100)
+    await stream_live_scores(websocket, f"court:{court_id}", games)
+
 @api_router.get("/games/me", response_model=List[Game])
-async def get_my_games(current_user: User = Depends(get_current_user)):
-    games = await db.games.find({
+async def get_my_games(
+    status: Optional[str] = None,
+    court_id: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    query: Dict[str, Any] = {
         "$or": [
             {"player1_id": current_user.id},
             {"player2_id": current_user.id}
         ]
-    }).to_list(1000)
-    return [Game(**game) for game in games]
+    }
+    if status:
+        query["status"] = status
+    if court_id:
+        query["court_id"] = court_id
+    
+    projection = parse_fields(fields, Game)
+    games, next_cursor = await fetch_page(db.games, query, limit, after,
+                                          projection or {"_id": 0, "recent_score_events": 0, "play_batches": 0})
+    return page_response(Game, games, next_cursor, projection)
+
+# Search Routes
+@api_router.get("/search")
+async def search(
+    q: str = Query(..., min_length=1),
+    types: Optional[str] = None,  # comma-separated subset of court,team,coach,user
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    current_user: Optional[User] = Depends(get_optional_user)
+):
+    # Users are only searchable by signed-in members
+    doc_types = search_types(types, current_user)
+    
+    results = search_index.search(q, doc_types)
+    return {
+        "query": q,
+        "total": len(results),
+        "offset": offset,
+        "results": [
+            {**{key: value for key, value in document.items() if key != "terms"}, "score": round(score, 4)}
+            for score, document in results[offset:offset + limit]
+        ]
+    }
+
+@api_router.get("/search/autocomplete")
+async def search_autocomplete(
+    q: str = Query(..., min_length=1),
+    types: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=50),
+    current_user: Optional[User] = Depends(get_optional_user)
+):
+    return {"query": q, "suggestions": search_index.suggest(q, limit, search_types(types, current_user))}
 
 # Statistics Routes
 @api_router.get("/stats/leaderboard")
-async def get_leaderboard():
-    # This would be implemented with aggregation pipelines
-    # For now, return mock data
-    return {"message": "Leaderboard endpoint - to be implemented"}
+async def get_leaderboard(
+    subject_type: str = Query("player", pattern="^(player|team)$"),
+    court_id: Optional[str] = None,
+    window: str = Query("all", pattern="^(all|month|week)$"),
+    period: Optional[str] = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE)
+):
+    scope, window_key = resolve_leaderboard_board(court_id, window, period)
+    board = await load_leaderboard_board(scope, window_key, subject_type)
+    entries = board.page(offset, limit)
+    
+    # Attach display names with one batched lookup for the page
+    ids = [entry["subject_id"] for entry in entries]
+    if subject_type == "player":
+        names = {doc["id"]: doc["username"] async for doc in db.users.find({"id": {"$in": ids}}, {"_id": 0, "id": 1, "username": 1})}
+    else:
+        names = {doc["id"]: doc["name"] async for doc in db.teams.find({"id": {"$in": ids}}, {"_id": 0, "id": 1, "name": 1})}
+    for entry in entries:
+        entry["name"] = names.get(entry["subject_id"])
+    
+    return {
+        "scope": scope,
+        "window": window_key,
+        "subject_type": subject_type,
+        "total": len(board),
+        "offset": offset,
+        "entries": entries
+    }
+
+@api_router.get("/stats/rollups/{subject_id}")
+async def get_stat_rollups(
+    subject_id: str,
+    subject_type: str = Query("player", pattern="^(player|team)$"),
+    period: str = Query("career", pattern="^(career|season|day)"),
+    limit: int = Query(30, ge=1, le=MAX_PAGE_SIZE)
+):
+    """One precomputed document for "career" or an exact "season:YYYY" / "day:YYYY-MM-DD";
+    "season" or "day" alone lists the most recent periods of that kind"""
+    query: Dict[str, Any] = {"subject_type": subject_type, "subject_id": subject_id}
+    if period in ("season", "day"):
+        query["period"] = {"$regex": f"^{period}:"}
+    else:
+        query["period"] = period
+    rollups = await db.stat_rollups.find(query, {"_id": 0}).sort("period", -1).to_list(limit)
+    if not rollups:
+        raise HTTPException(status_code=404, detail="No stats for this subject and period")
+    
+    return {"subject_type": subject_type, "subject_id": subject_id, "rollups": rollups}
+
+@api_router.get("/stats/leaderboard/{subject_id}")
+async def get_leaderboard_rank(
+    subject_id: str,
+    subject_type: str = Query("player", pattern="^(player|team)$"),
+    court_id: Optional[str] = None,
+    window: str = Query("all", pattern="^(all|month|week)$"),
+    period: Optional[str] = None
+):
+    scope, window_key = resolve_leaderboard_board(court_id, window, period)
+    board = await load_leaderboard_board(scope, window_key, subject_type)
+    rank = board.rank(subject_id)
+    if rank is None:
+        raise HTTPException(status_code=404, detail="No leaderboard entry for this subject")
+    
+    return {
+        "scope": scope,
+        "window": window_key,
+        "total": len(board),
+        **board.entries[subject_id],
+        "rank": rank
+    }
+
+# Export Routes
+# Collections that can be streamed as NDJSON, mapped to the filter applied for the caller
+EXPORT_COLLECTIONS = {
+    "courts": lambda user: {},
+    "tournaments": lambda user: {},
+    "challenges": lambda user: {},
+    "teams": lambda user: {},
+    "coaches": lambda user: {},
+    "bookings": lambda user: {"user_id": user.id},
+    "games": lambda user: {"$or": [{"player1_id": user.id}, {"player2_id": user.id}]},
+}
+
+@api_router.get("/export/{collection}")
+async def export_collection(
+    collection: str,
+    batch_size: int = Query(EXPORT_BATCH_SIZE, ge=1, le=10000),
+    current_user: User = Depends(get_current_user)
+):
+    if collection not in EXPORT_COLLECTIONS:
+        raise HTTPException(status_code=404, detail="Collection not exportable")
+    
+    cursor = db[collection].find(
+        EXPORT_COLLECTIONS[collection](current_user),
+        {"_id": 0, "recent_score_events": 0, "play_batches": 0}
+    ).sort([("created_at", 1), ("id", 1)]).batch_size(batch_size)
+    
+    return StreamingResponse(ndjson_lines(cursor), media_type="application/x-ndjson")
+
+# Admin Routes
+@api_router.get("/admin/indexes")
+async def get_index_report(admin_user: User = Depends(get_admin_user)):
+    existing: Dict[str, List[List[List[Any]]]] = {}
+    for collection in {spec["collection"] for spec in INDEX_REGISTRY}:
+        info = await db[collection].index_information()
+        existing[collection] = [index_key_signature(index["key"]) for index in info.values()]
+    
+    report = []
+    for spec in INDEX_REGISTRY:
+        keys = index_key_signature(spec["keys"])
+        report.append({
+            "collection": spec["collection"],
+            "keys": keys,
+            "options": spec.get("options", {}),
+            "queries": spec["queries"],
+            "covered": keys in existing[spec["collection"]]
+        })
+    
+    return {
+        "indexes": report,
+        "uncovered": [entry for entry in report if not entry["covered"]]
+    }
+
+@api_router.post("/admin/stats/rollups")
+async def trigger_stat_rollups(admin_user: User = Depends(get_admin_user)):
+    window = await run_stat_rollups()
+    if window is None:
+        raise HTTPException(status_code=409, detail="A stat rollup run is already in progress")
+    return {"message": "Stat rollups updated", "window": window}
+
+@api_router.post("/admin/ratings/recompute", status_code=202)
+async def start_rating_recompute(admin_user: User = Depends(get_admin_user)):
+    if await db.jobs.find_one({"type": "ratings.recompute", "status": {"$in": ["pending", "running"]}}, {"_id": 1}):
+        raise HTTPException(status_code=409, detail="A rating recompute is already queued or running")
+    
+    job_id = await enqueue_job("ratings.recompute", {})
+    return {"message": "Rating recompute queued", "job_id": job_id}
+
+@api_router.get("/admin/jobs")
+async def get_job_summary(admin_user: User = Depends(get_admin_user)):
+    counts = await db.jobs.aggregate([
+        {"$group": {"_id": {"type": "$type", "status": "$status"}, "count": {"$sum": 1}}}
+    ]).to_list(None)
+    summary: Dict[str, Dict[str, int]] = {job_type: {} for job_type in JOB_TYPES}
+    for entry in counts:
+        summary.setdefault(entry["_id"]["type"], {})[entry["_id"]["status"]] = entry["count"]
+    failed = await db.jobs.find({"status": "failed"}, {"_id": 0}).sort("failed_at", -1).to_list(20)
+    
+    return {"jobs": summary, "recent_failures": failed}
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 @api_router.get("/")
 async def root():
@@ -619,14 +3526,81 @@ async def root():
 # Include the router in the main app
 app.include_router(api_router)
 
+# Registered before CORS so per-origin CORS headers are never stored in the cache
+@app.middleware("http")
+async def response_cache_middleware(request: Request, call_next):
+    namespace = response_cache_namespace(request)
+    if namespace is None:
+        return await call_next(request)
+    
+    query = "&".join(f"{key}={value}" for key, value in sorted(request.query_params.multi_items()))
+    key = f"{namespace}:{await response_cache.generation(namespace)}:{request.url.path}?{query}"
+    cached = await response_cache.get(key)
+    cache_status = "HIT"
+    if cached is None:
+        response = await call_next(request)
+        if response.status_code != 200:
+            return response
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        headers = {name: value for name, value in response.headers.items() if name.lower() != "content-length"}
+        headers["ETag"] = f'"{hashlib.sha1(body).hexdigest()}"'
+        cached = {"body": body, "headers": headers}
+        await response_cache.set(key, cached)
+        cache_status = "MISS"
+    
+    etag = cached["headers"]["ETag"]
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers={"ETag": etag, "X-Cache": cache_status})
+    return Response(content=cached["body"], status_code=200, headers={**cached["headers"], "X-Cache": cache_status})
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    # Browsers only let the frontend read response headers listed here
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+def route_template(scope: Dict[str, Any]) -> str:
+    """Template of the route a request maps to; set by the router, or matched here for
+    requests answered before routing (response cache hits, CORS preflights)"""
+    route = scope.get("route")
+    if route is None:
+        partial = None
+        for candidate in app.router.routes:
+            match, _ = candidate.matches(scope)
+            if match == Match.FULL:
+                route = candidate
+                break
+            if match == Match.PARTIAL and partial is None:
+                partial = candidate
+        route = route or partial
+    return route.path if route is not None else "unmatched"
+
+# Outermost middleware, so cache hits and CORS handling are included in the timings
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    current = RequestMetrics()
+    token = request_metrics.set(current)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        request_metrics.reset(token)
+    elapsed = time.perf_counter() - start
+    
+    # Label by route template rather than raw path to keep label cardinality bounded
+    labels = {"method": request.method, "route": route_template(request.scope)}
+    route_labels = {"route": labels["route"]}
+    metrics.inc("http_requests_total", {**labels, "status": str(response.status_code)})
+    metrics.observe("http_request_duration_seconds", labels, elapsed)
+    metrics.observe("mongo_commands_per_request", route_labels, current.mongo_commands, COUNT_BUCKETS)
+    metrics.observe("mongo_documents_returned_per_request", route_labels, current.documents_returned, DOCUMENT_BUCKETS)
+    metrics.observe("response_serialization_seconds", route_labels, current.serialization_seconds)
+    return response
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -638,6 +3612,16 @@ logger = logging.getLogger(__name__)
 async def startup_event():
     logger.info("M2DG Basketball Platform API starting up...")
     
+    await ensure_indexes()
+    
+    if await db.court_occupancy.estimated_document_count() == 0 and await db.bookings.estimated_document_count() > 0:
+        await rebuild_court_occupancy()
+        logger.info("Court occupancy bitmaps rebuilt from bookings")
+    
+    await load_matchmaking_index()
+    today = check_in_clock().replace(hour=0, minute=0, second=0, microsecond=0)
+    await load_check_in_index(today)
+    
     # Initialize some sample data if collections are empty
     if await db.courts.count_documents({}) == 0:
         sample_courts = [
@@ -672,7 +3656,21 @@ async def startup_event():
         ]
         await db.courts.insert_many(sample_courts)
         logger.info("Sample courts created")
+    
+    await load_search_index()
+    
+    if MATCHMAKING_RELOAD_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(matchmaking_reload_loop()))
+    if SEARCH_RELOAD_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(search_reload_loop()))
+    if STAT_ROLLUP_INTERVAL_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(stat_rollup_loop()))
+    if JOB_WORKER_IN_PROCESS:
+        background_tasks.extend(start_job_workers())
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in background_tasks:
+        task.cancel()
     client.close()
+    password_executor.shutdown(wait=False)
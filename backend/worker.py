@@ -0,0 +1,49 @@
+"""Background job worker for the M2DG API.
+
+Runs the queued side effects (leaderboard, ratings and bracket updates, court
+occupancy, coach flags, rating recomputes) outside the API process. Start one or
+more of these and set JOB_WORKER_IN_PROCESS=false on the API servers:
+
+    python worker.py
+    python worker.py --types game.completed,booking.created
+
+The worker writes to MongoDB only; the API processes' in-memory state catches up
+on its own schedule. Leaderboard boards reload after LEADERBOARD_REFRESH_SECONDS
+and cached principals (e.g. the is_coach flag) after USER_CACHE_TTL_SECONDS.
+Matchmaking re-reads the creator ratings of the challenges it returns, and its
+index is rebuilt every MATCHMAKING_RELOAD_SECONDS.
+"""
+import argparse
+import asyncio
+
+import server
+
+
+async def run(job_types):
+    await server.ensure_indexes()
+    tasks = server.start_job_workers(job_types)
+    server.logger.info(f"Job worker polling {', '.join(job_types or server.JOB_TYPES)}")
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        server.client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Background job worker for the M2DG API")
+    parser.add_argument("--types", help="comma-separated job types to run (default: all)")
+    args = parser.parse_args()
+
+    job_types = [job_type.strip() for job_type in args.types.split(",")] if args.types else None
+    unknown = set(job_types or []) - set(server.JOB_TYPES)
+    if unknown:
+        parser.error(f"unknown job types: {', '.join(sorted(unknown))}")
+
+    try:
+        asyncio.run(run(job_types))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""Load benchmark for the M2DG API.
+
+Replays the backend_test.py scenarios (register -> login -> book -> tournament ->
+team -> game score) as concurrent virtual users against the in-process ASGI app,
+reports p50/p95/p99 latency and requests/sec per endpoint, and fails when p95
+latency or throughput regress against a stored baseline.
+
+By default MongoDB is replaced with mongomock; pass --mongo-url to run against a
+real mongod (a throwaway database is created and dropped).
+
+    python backend_benchmark.py --users 50 --iterations 5
+    python backend_benchmark.py --update-baseline
+
+--serialization N skips the load run and instead times list-response serialization
+for N court documents: the old path (Court(**doc) per document, then FastAPI's
+response_model validation and JSON encoding) against the trusted shaping fast
+path used by the list handlers (trusted_documents + ORJSONResponse).
+
+    python backend_benchmark.py --serialization 1000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+DEFAULT_BASELINE = ROOT_DIR / "benchmark_baseline.json"
+
+# server.py reads these at import time
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "m2dg_benchmark")
+# Keep password hashing cheap unless the run is about bcrypt cost itself
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+sys.path.insert(0, str(ROOT_DIR / "backend"))
+
+import httpx  # noqa: E402
+import server  # noqa: E402
+
+
+class LatencyRecorder:
+    """Collects request latencies per endpoint label"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.failures = defaultdict(int)
+
+    async def request(self, client, label, method, url, expected_status=200, **kwargs):
+        start = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.samples[label].append(time.perf_counter() - start)
+        if response.status_code != expected_status:
+            self.failures[label] += 1
+            return None
+        return response.json()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def virtual_user(client, recorder, user_index, iterations):
+    """One user running the backend_test.py flow `iterations` times"""
+    suffix = uuid.uuid4().hex[:8]
+    user = {
+        "username": f"bench_{suffix}",
+        "email": f"bench_{suffix}@example.com",
+        "password": "Password123!",
+        "full_name": "Benchmark User",
+        "phone": "555-123-4567"
+    }
+    registered = await recorder.request(client, "POST /auth/register", "POST", "/api/auth/register", json=user)
+    if not registered:
+        return
+    user_id = registered["user_id"]
+
+    for iteration in range(iterations):
+        login = await recorder.request(client, "POST /auth/login", "POST", "/api/auth/login",
+                                       json={"email": user["email"], "password": user["password"]})
+        if not login:
+            continue
+        headers = {"Authorization": f"Bearer {login['access_token']}"}
+
+        await recorder.request(client, "GET /users/me", "GET", "/api/users/me", headers=headers)
+        courts = await recorder.request(client, "GET /courts", "GET", "/api/courts")
+        if not courts:
+            continue
+        court_id = courts[0]["id"]
+
+        # Every (user, iteration) books its own day so bookings never conflict
+        booking_day = datetime(2031, 1, 1) + timedelta(days=user_index * iterations + iteration)
+        await recorder.request(client, "POST /bookings", "POST", "/api/bookings", headers=headers, json={
+            "court_id": court_id,
+            "date": booking_day.strftime("%Y-%m-%d"),
+            "start_time": "10:00",
+            "duration_hours": 2,
+            "special_requests": "Benchmark booking"
+        })
+        await recorder.request(client, "GET /bookings/me", "GET", "/api/bookings/me", headers=headers)
+
+        tournament = await recorder.request(client, "POST /tournaments", "POST", "/api/tournaments", headers=headers, json={
+            "name": f"Benchmark Tournament {suffix}-{iteration}",
+            "description": "Load test tournament",
+            "start_date": booking_day.isoformat(),
+            "end_date": (booking_day + timedelta(days=2)).isoformat(),
+            "entry_fee": 25.0,
+            "max_participants": 16,
+            "prize_pool": 500.0,
+            "rules": ["Single elimination"]
+        })
+        if tournament:
+            await recorder.request(client, "POST /tournaments/{id}/register", "POST",
+                                   f"/api/tournaments/{tournament['id']}/register", headers=headers)
+        await recorder.request(client, "GET /tournaments", "GET", "/api/tournaments")
+
+        await recorder.request(client, "POST /teams", "POST", "/api/teams", headers=headers, json={
+            "name": f"Benchmark Team {suffix}-{iteration}",
+            "description": "Load test team",
+            "max_members": 10
+        })
+        await recorder.request(client, "GET /teams", "GET", "/api/teams")
+
+        game = await recorder.request(client, "POST /games", "POST", "/api/games", headers=headers, json={
+            "player1_id": user_id,
+            "court_id": court_id,
+            "scheduled_date": booking_day.isoformat(),
+            "game_type": "1v1"
+        })
+        if game:
+            await recorder.request(client, "PUT /games/{id}/score", "PUT", f"/api/games/{game['id']}/score",
+                                   headers=headers, json={
+                                       "score": {"player1": 21, "player2": 15},
+                                       "status": "completed",
+                                       "winner": user_id
+                                   })
+        await recorder.request(client, "GET /games/me", "GET", "/api/games/me", headers=headers)
+
+
+def emulate_bit_updates():
+    """mongomock does not implement $bit (used for court occupancy bitmaps); apply
+    `$bit: {field: {or: mask}}` upserts as a read-modify-write instead"""
+    from mongomock.collection import Collection
+
+    bulk_write = Collection.bulk_write
+
+    def bulk_write_with_bit(self, requests, *args, **kwargs):
+        remaining = []
+        for request in requests:
+            document = getattr(request, "_doc", None)
+            if not (isinstance(document, dict) and "$bit" in document):
+                remaining.append(request)
+                continue
+            current = self.find_one(request._filter) or dict(request._filter)
+            for field, operation in document["$bit"].items():
+                current[field] = int(current.get(field, 0)) | int(operation["or"])
+            self.replace_one(request._filter, current, upsert=True)
+        if remaining:
+            return bulk_write(self, remaining, *args, **kwargs)
+
+    Collection.bulk_write = bulk_write_with_bit
+
+
+async def connect_database(mongo_url):
+    if mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(mongo_url)
+        name = f"m2dg_benchmark_{uuid.uuid4().hex[:8]}"
+        return client, client[name], name
+    from mongomock_motor import AsyncMongoMockClient
+    emulate_bit_updates()
+    client = AsyncMongoMockClient()
+    return client, client["m2dg_benchmark"], None
+
+
+async def run_benchmark(users, iterations, mongo_url):
+    client, database, throwaway = await connect_database(mongo_url)
+    server.db = database
+    server.db_reads = database
+    await server.startup_event()
+
+    recorder = LatencyRecorder()
+    transport = httpx.ASGITransport(app=server.app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as http:
+        started = time.perf_counter()
+        await asyncio.gather(*[virtual_user(http, recorder, index, iterations) for index in range(users)])
+        elapsed = time.perf_counter() - started
+
+    if throwaway:
+        await client.drop_database(throwaway)
+
+    endpoints = {}
+    for label, samples in sorted(recorder.samples.items()):
+        ordered = sorted(samples)
+        endpoints[label] = {
+            "count": len(ordered),
+            "failures": recorder.failures[label],
+            "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+            "rps": round(len(ordered) / elapsed, 2)
+        }
+    total = sum(entry["count"] for entry in endpoints.values())
+    return {
+        "users": users,
+        "iterations": iterations,
+        "elapsed_seconds": round(elapsed, 3),
+        "total_requests": total,
+        "total_rps": round(total / elapsed, 2),
+        "endpoints": endpoints
+    }
+
+
+def serialization_documents(count):
+    from bson import ObjectId
+    now = datetime.utcnow()
+    return [{
+        "_id": ObjectId(),
+        "id": str(uuid.uuid4()),
+        "name": f"Court {index}",
+        "location": f"{index} Main St",
+        "description": "Indoor court with hardwood floors",
+        "court_type": "indoor",
+        "surface_type": "hardwood",
+        "amenities": ["Lighting", "Scoreboard", "Locker Rooms"],
+        "hourly_rate": 40.0,
+        "capacity": 20,
+        "is_available": True,
+        "images": [],
+        "created_at": now
+    } for index in range(count)]
+
+
+async def run_serialization_benchmark(count, repeats=20):
+    """Per-document cost of rendering a list response, before and after the fast path"""
+    from typing import List
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_response_field
+
+    documents = serialization_documents(count)
+    field = create_response_field(name="Response_get_courts", type_=List[server.Court], mode="serialization")
+
+    async def before():
+        courts = [server.Court(**doc) for doc in documents]
+        content = await serialize_response(field=field, response_content=courts)
+        return JSONResponse(content).body
+
+    async def after():
+        # The fast path reads with {"_id": 0}, so its documents never carry _id
+        projected = [{key: value for key, value in doc.items() if key != "_id"} for doc in documents]
+        started = time.perf_counter()
+        body = server.page_response(server.Court, projected, None, None).body
+        return body, time.perf_counter() - started
+
+    assert json.loads(await before()) == json.loads((await after())[0])
+    timings = {"before": [], "after": []}
+    for _ in range(repeats):
+        started = time.perf_counter()
+        await before()
+        timings["before"].append(time.perf_counter() - started)
+        timings["after"].append((await after())[1])
+    return {label: min(samples) / count * 1e6 for label, samples in timings.items()}
+
+
+def print_report(report):
+    print(f"\n=== Benchmark: {report['users']} users x {report['iterations']} iterations ===\n")
+    print(f"{'endpoint':<34}{'count':>7}{'fail':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+    for label, entry in report["endpoints"].items():
+        print(f"{label:<34}{entry['count']:>7}{entry['failures']:>6}{entry['p50_ms']:>10.2f}"
+              f"{entry['p95_ms']:>10.2f}{entry['p99_ms']:>10.2f}{entry['rps']:>10.1f}")
+    print(f"\nTotal: {report['total_requests']} requests in {report['elapsed_seconds']}s "
+          f"({report['total_rps']} req/s)")
+
+
+def compare_to_baseline(report, baseline, tolerance):
+    """Return a list of regressions beyond the allowed tolerance"""
+    regressions = []
+    for label, entry in report["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(label)
+        if previous is None:
+            continue
+        if entry["failures"] > previous.get("failures", 0):
+            regressions.append(f"{label}: {entry['failures']} failures (baseline {previous.get('failures', 0)})")
+        if previous["p95_ms"] > 0 and entry["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{label}: p95 {entry['p95_ms']}ms vs baseline {previous['p95_ms']}ms")
+    if baseline.get("total_rps") and report["total_rps"] < baseline["total_rps"] * (1 - tolerance):
+        regressions.append(f"throughput {report['total_rps']} req/s vs baseline {baseline['total_rps']} req/s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load benchmark for the M2DG API")
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--iterations", type=int, default=3, help="scenario runs per virtual user")
+    parser.add_argument("--mongo-url", default=os.environ.get("BENCHMARK_MONGO_URL"),
+                        help="real MongoDB to run against (default: mongomock)")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument("--update-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed regression, as a fraction")
+    parser.add_argument("--serialization", type=int, metavar="DOCS",
+                        help="time list-response serialization for DOCS documents instead of the load run")
+    args = parser.parse_args()
+
+    if args.serialization:
+        per_document = asyncio.run(run_serialization_benchmark(args.serialization))
+        print(f"\n=== Serialization: {args.serialization} court documents per response ===\n")
+        print(f"before (Court(**doc) + response_model + JSONResponse): {per_document['before']:.2f} us/doc")
+        print(f"after  (trusted shaping + ORJSONResponse):            {per_document['after']:.2f} us/doc")
+        print(f"speedup: {per_document['before'] / per_document['after']:.1f}x")
+        return 0
+
+    # One INFO line per request would drown the report
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    report = asyncio.run(run_benchmark(args.users, args.iterations, args.mongo_url))
+    print_report(report)
+
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2))
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline to create one")
+        return 0
+
+    regressions = compare_to_baseline(report, json.loads(args.baseline.read_text()), args.tolerance)
+    if regressions:
+        print("\n❌ Regressions against baseline:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        return 1
+    print("\n✅ No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
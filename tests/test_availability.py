@@ -0,0 +1,43 @@
+from datetime import datetime
+
+import numpy as np
+
+import server
+
+
+def slot(hour, minute=0):
+    return (hour * 60 + minute) // server.BOOKING_SLOT_MINUTES
+
+
+def test_occupancy_masks_set_the_covered_slots():
+    masks = server.occupancy_masks(datetime(2030, 1, 5, 18, 0), datetime(2030, 1, 5, 19, 0))
+
+    am, pm = masks["2030-01-05"]
+    assert am == 0
+    expected = sum(1 << (index - server.SLOTS_PER_WORD) for index in range(slot(18), slot(19)))
+    assert pm == expected
+
+
+def test_occupancy_masks_split_bookings_across_midnight():
+    masks = server.occupancy_masks(datetime(2030, 1, 5, 23, 30), datetime(2030, 1, 6, 0, 30))
+
+    assert set(masks) == {"2030-01-05", "2030-01-06"}
+    assert masks["2030-01-05"][0] == 0
+    assert masks["2030-01-06"] == [0b11, 0]
+
+
+def test_occupancy_bits_unpack_what_the_masks_pack():
+    masks = server.occupancy_masks(datetime(2030, 1, 5, 9, 15), datetime(2030, 1, 5, 13, 0))
+    words = np.array([masks["2030-01-05"]], dtype=np.uint64)
+
+    busy = server.occupancy_bits(words)[0]
+    assert busy.shape == (server.SLOTS_PER_DAY,)
+    assert np.flatnonzero(busy).tolist() == list(range(slot(9, 15), slot(13)))
+
+
+def test_slot_fits_marks_starts_with_enough_free_slots():
+    free = np.array([True, True, False, True, True, True, False, True])
+
+    assert server.slot_fits(free, 1).tolist() == free.tolist()
+    assert server.slot_fits(free, 2).tolist() == [True, False, False, True, True, False, False]
+    assert server.slot_fits(free, 3).tolist() == [False, False, False, True, False, False]
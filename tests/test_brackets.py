@@ -0,0 +1,94 @@
+from itertools import combinations
+
+import server
+from server import BYE
+
+
+def play_out(matches):
+    """Decide every playable match in favour of its first slot until none are left"""
+    while True:
+        playable = [index for index, match in enumerate(matches)
+                    if match["winner"] is None and None not in match["slots"]]
+        if not playable:
+            return
+        server.decide_match(matches, playable[0], matches[playable[0]]["slots"][0], {})
+
+
+def test_seed_positions_pairs_top_seeds_with_bottom_seeds():
+    assert server.seed_positions(2) == [1, 2]
+    assert server.seed_positions(8) == [1, 8, 4, 5, 2, 7, 3, 6]
+
+
+def test_single_elimination_gives_byes_to_top_seeds():
+    seeds = [f"p{number}" for number in range(1, 6)]
+    matches = server.build_elimination_bracket(seeds, double=False)
+
+    assert len(matches) == 7
+    first_round = [match for match in matches if match["round"] == 1]
+    assert sum(BYE in match["slots"] for match in first_round) == 3
+    advanced = {match["winner"] for match in first_round if match["winner"] is not None}
+    assert advanced == {"p1", "p2", "p3"}
+    assert matches[-1]["winner_to"] is None
+
+
+def test_single_elimination_plays_out_to_the_top_seed():
+    seeds = [f"p{number}" for number in range(1, 9)]
+    matches = server.build_elimination_bracket(seeds, double=False)
+    play_out(matches)
+
+    bracket = {"format": "single_elimination", "seeds": seeds, "matches": matches}
+    assert server.bracket_champion(bracket) == "p1"
+
+
+def test_double_elimination_sends_losers_to_the_losers_bracket():
+    seeds = ["a", "b", "c", "d"]
+    matches = server.build_elimination_bracket(seeds, double=True)
+    assert {match["stage"] for match in matches} == {"winners", "losers", "final"}
+    assert matches[-1]["stage"] == "final"
+
+    play_out(matches)
+    assert all(match["winner"] is not None for match in matches)
+    final = matches[-1]
+    assert final["winner"] == "a"
+    assert final["slots"][1] != "a"
+
+
+def test_settle_bye_advances_the_real_participant():
+    matches = server.build_elimination_bracket(["a", "b", "c"], double=False)
+    bye_match = next(index for index, match in enumerate(matches) if BYE in match["slots"])
+    target, slot = matches[bye_match]["winner_to"]
+
+    assert matches[bye_match]["winner"] == "a"
+    assert matches[target]["slots"][slot] == "a"
+
+
+def test_decide_match_reports_only_the_fields_it_fills():
+    matches = server.build_elimination_bracket(["a", "b", "c", "d"], double=False)
+    changes = {}
+    server.decide_match(matches, 0, "a", changes)
+
+    target, slot = matches[0]["winner_to"]
+    assert changes == {
+        "bracket.matches.0.winner": "a",
+        f"bracket.matches.{target}.slots.{slot}": "a",
+    }
+
+
+def test_round_robin_pairs_everyone_once():
+    seeds = ["a", "b", "c", "d", "e"]
+    matches = server.build_round_robin(seeds)
+
+    pairs = [frozenset(match["slots"]) for match in matches]
+    assert len(pairs) == len(set(pairs)) == 10
+    assert set(pairs) == {frozenset(pair) for pair in combinations(seeds, 2)}
+
+
+def test_round_robin_champion_needs_every_result():
+    seeds = ["a", "b", "c"]
+    matches = server.build_round_robin(seeds)
+    bracket = {"format": "round_robin", "seeds": seeds, "matches": matches}
+    assert server.bracket_champion(bracket) is None
+
+    for match in matches:
+        match["winner"] = "b" if "b" in match["slots"] else match["slots"][0]
+    assert server.bracket_champion(bracket) == "b"
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta, timezone
+
+import server
+
+
+def challenge(challenge_id, created_by, scheduled, **fields):
+    return {"id": challenge_id, "created_by": created_by, "scheduled_date": scheduled,
+            "challenged_user": None, "court_id": None, **fields}
+
+
+def test_rings_cover_each_cell_once():
+    index = server.MatchmakingIndex()
+    seen = []
+    for distance in range(3):
+        seen.extend(index.ring((10, 100), distance))
+
+    scheduled = [cell for cell in seen if cell[1] is not None]
+    assert len(scheduled) == len(set(scheduled)) == 25
+    assert {cell for cell in scheduled} == {(10 + r, 100 + w) for r in range(-2, 3) for w in range(-2, 3)}
+    unscheduled = [cell for cell in seen if cell[1] is None]
+    assert sorted(unscheduled) == [(bucket, None) for bucket in range(8, 13)]
+
+
+def test_find_prefers_closer_ratings():
+    index = server.MatchmakingIndex()
+    moment = datetime.utcnow() + timedelta(days=1)
+    index.add(challenge("near", "a", moment), 1510)
+    index.add(challenge("far", "b", moment), 1900)
+
+    found = [found_challenge["id"] for _, found_challenge in index.find("me", 1500, moment, None, 10)]
+    assert found == ["near", "far"]
+
+
+def test_find_skips_own_and_directed_challenges():
+    index = server.MatchmakingIndex()
+    moment = datetime.utcnow() + timedelta(days=1)
+    index.add(challenge("own", "me", moment), 1500)
+    index.add(challenge("other", "a", moment, challenged_user="someone"), 1500)
+    index.add(challenge("mine", "b", moment, challenged_user="me"), 1500)
+
+    assert [found["id"] for _, found in index.find("me", 1500, moment, None, 10)] == ["mine"]
+
+
+def test_find_evicts_expired_challenges():
+    index = server.MatchmakingIndex()
+    now = datetime.utcnow()
+    index.add(challenge("past", "a", now - timedelta(hours=1)), 1500)
+    index.add(challenge("soon", "b", now + timedelta(hours=1)), 1500)
+
+    assert [found["id"] for _, found in index.find("me", 1500, now, None, 10)] == ["soon"]
+    assert "past" not in index.challenges
+    assert len(index) == 1
+
+
+def test_rerate_moves_a_creators_challenges():
+    index = server.MatchmakingIndex()
+    moment = datetime.utcnow() + timedelta(days=1)
+    index.add(challenge("c1", "a", moment), 1500)
+    index.rerate("a", 2000)
+
+    cell, rating = index.challenges["c1"]
+    assert rating == 2000
+    assert cell[0] == index.rating_bucket(2000)
+
+
+def test_naive_utc_converts_offset_aware_datetimes():
+    aware = datetime(2030, 1, 1, 12, 0, tzinfo=timezone(timedelta(hours=2)))
+    assert server.naive_utc(aware) == datetime(2030, 1, 1, 10, 0)
+    assert server.naive_utc(datetime(2030, 1, 1, 12, 0)) == datetime(2030, 1, 1, 12, 0)
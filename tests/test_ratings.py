@@ -0,0 +1,48 @@
+import random
+
+import numpy as np
+
+import server
+
+
+def sequential_ratings(pairs):
+    ratings, games = {}, {}
+    for winner, loser in pairs:
+        winner_rating = ratings.get(winner, server.RATING_INITIAL)
+        loser_rating = ratings.get(loser, server.RATING_INITIAL)
+        delta = server.elo_delta(winner_rating, loser_rating)
+        ratings[winner] = winner_rating + delta
+        ratings[loser] = loser_rating - delta
+        for player in (winner, loser):
+            games[player] = games.get(player, 0) + 1
+    return ratings, games
+
+
+def test_elo_delta_rewards_upsets_more():
+    even = server.elo_delta(1500, 1500)
+    assert even == server.RATING_K_FACTOR / 2
+    assert server.elo_delta(1400, 1600) > even > server.elo_delta(1600, 1400)
+
+
+def test_apply_chunk_matches_a_sequential_replay():
+    generator = random.Random(17)
+    players = [f"p{number}" for number in range(40)]
+    pairs = [tuple(generator.sample(players, 2)) for _ in range(2000)]
+
+    table = server.RatingTable()
+    for start in range(0, len(pairs), 300):
+        table.apply_chunk(pairs[start:start + 300])
+
+    ratings, games = sequential_ratings(pairs)
+    for player, position in table.positions.items():
+        assert np.isclose(table.ratings[position], ratings[player])
+        assert table.games[position] == games[player]
+
+
+def test_rating_table_grows_past_its_initial_capacity():
+    table = server.RatingTable()
+    pairs = [(f"w{number}", f"l{number}") for number in range(1500)]
+    table.apply_chunk(pairs)
+
+    assert len(table.positions) == 3000
+    assert np.isclose(table.ratings[table.positions["w0"]], server.RATING_INITIAL + server.RATING_K_FACTOR / 2)
@@ -0,0 +1,66 @@
+import server
+
+
+def build_index():
+    index = server.SearchIndex()
+    index.index("court", {"id": "c1", "name": "Riverside Outdoor Court", "amenities": ["lights"],
+                          "description": "Full court by the river", "location": "Riverside"})
+    index.index("court", {"id": "c2", "name": "Downtown Rec Center", "amenities": ["lockers"],
+                          "description": "Indoor hardwood", "location": "Downtown"})
+    index.index("team", {"id": "t1", "name": "River Hawks", "description": "Sunday league"})
+    index.index("user", {"id": "u1", "username": "riverking", "full_name": "Rita Rivers"})
+    return index
+
+
+def result_ids(results):
+    return [document["id"] for _, document in results]
+
+
+def test_expand_returns_sorted_terms_with_the_prefix():
+    index = build_index()
+    assert index.expand("river") == ["river", "riverking", "rivers", "riverside"]
+    assert index.expand("zzz") == []
+
+
+def test_search_requires_every_word():
+    index = build_index()
+    assert result_ids(index.search("riverside court", {"court"})) == ["c1"]
+    assert index.search("riverside lockers", {"court"}) == []
+
+
+def test_last_word_matches_as_a_prefix():
+    index = build_index()
+    assert result_ids(index.search("down", {"court"})) == ["c2"]
+    assert result_ids(index.search("riverside out", {"court"})) == ["c1"]
+
+
+def test_exact_matches_outrank_completions():
+    index = build_index()
+    # u1 only matches through completions (riverking, rivers), t1 by its name
+    results = result_ids(index.search("river", {"court", "team", "user"}))
+    assert results[0] == "t1"
+    assert results[-1] == "u1"
+    assert set(results) == {"c1", "t1", "u1"}
+
+
+def test_search_is_limited_to_the_requested_types():
+    index = build_index()
+    assert result_ids(index.search("river", {"team"})) == ["t1"]
+
+
+def test_reindexing_and_removal_drop_stale_terms():
+    index = build_index()
+    index.index("team", {"id": "t1", "name": "Lake Hawks"})
+    assert index.search("river", {"team"}) == []
+    assert result_ids(index.search("lake", {"team"})) == ["t1"]
+
+    index.remove(("team", "t1"))
+    assert "lake" not in index.terms
+    assert "hawks" not in index.postings
+
+
+def test_suggest_counts_only_searchable_types():
+    index = build_index()
+    public = {"court", "team", "coach"}
+    assert [suggestion["term"] for suggestion in index.suggest("riv", 10, public)] == ["river", "riverside"]
+    assert "riverking" in [suggestion["term"] for suggestion in index.suggest("riv", 10, public | {"user"})]
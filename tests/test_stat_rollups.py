@@ -0,0 +1,115 @@
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+import server
+
+
+# The rollups end in $merge, which only a real mongod runs; these tests use their own
+# database on the server MONGO_URL points at and are skipped when none answers
+def mongo_available():
+    client = MongoClient(os.environ["MONGO_URL"], serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command("ping")
+        return True
+    except PyMongoError:
+        return False
+    finally:
+        client.close()
+
+
+pytestmark = pytest.mark.skipif(not mongo_available(), reason="needs a MongoDB server at MONGO_URL")
+
+
+def run_against_mongo(monkeypatch, scenario):
+    async def main():
+        client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+        db = client[f"{os.environ['DB_NAME']}_stat_rollups_{uuid.uuid4().hex[:8]}"]
+        monkeypatch.setattr(server, "db", db)
+        try:
+            await server.ensure_indexes()
+            await scenario(db)
+        finally:
+            await client.drop_database(db.name)
+            client.close()
+    asyncio.run(main())
+
+
+def completed_game(winner, loser, points, ended_at):
+    return {
+        "id": str(uuid.uuid4()), "status": "completed", "player1_id": winner, "player2_id": loser,
+        "score": {winner: points[0], loser: points[1]}, "winner": winner,
+        "created_at": ended_at - timedelta(hours=1), "actual_end_time": ended_at,
+    }
+
+
+async def insert_players(db, *player_ids):
+    await db.users.insert_many([{"id": player_id, "email": f"{player_id}@example.com", "stats": {}}
+                                for player_id in player_ids])
+
+
+async def career(db, player_id):
+    return await db.stat_rollups.find_one(
+        {"subject_type": "player", "subject_id": player_id, "period": "career"}, {"_id": 0})
+
+
+def test_rollups_add_new_windows_to_existing_totals(monkeypatch):
+    async def scenario(db):
+        await insert_players(db, "a", "b")
+        ended_at = datetime.utcnow() - timedelta(minutes=5)
+        await db.games.insert_one(completed_game("a", "b", (21, 15), ended_at))
+        await server.run_stat_rollups()
+
+        await db.games.insert_one(completed_game("b", "a", (21, 18), datetime.utcnow() - timedelta(minutes=1)))
+        await server.run_stat_rollups()
+
+        rollup = await career(db, "a")
+        assert {counter: rollup[counter] for counter in server.STAT_ROLLUP_COUNTERS} == {
+            "games": 2, "wins": 1, "losses": 1, "draws": 0, "points_for": 39, "points_against": 36}
+        season = await db.stat_rollups.find_one(
+            {"subject_type": "player", "subject_id": "a", "period": f"season:{ended_at.year}"})
+        assert season["games"] >= 1
+        user = await db.users.find_one({"id": "a"})
+        assert user["stats"]["career"]["games"] == 2
+    run_against_mongo(monkeypatch, scenario)
+
+
+def test_retried_window_does_not_add_twice(monkeypatch):
+    async def scenario(db):
+        await insert_players(db, "a", "b")
+        await db.games.insert_one(completed_game("a", "b", (21, 15), datetime.utcnow() - timedelta(minutes=1)))
+        window = await server.run_stat_rollups()
+
+        # Hand the same window back as a failed run would have
+        await db.pipeline_state.update_one({"_id": "stat_rollups"},
+                                           {"$set": {"watermark": window["from"], "retry_to": window["to"]}})
+        assert await server.run_stat_rollups() == window
+        assert (await career(db, "a"))["games"] == 1
+    run_against_mongo(monkeypatch, scenario)
+
+
+def test_reopened_game_is_not_rolled_up_again(monkeypatch):
+    monkeypatch.setattr(server, "STAT_ROLLUP_LAG_SECONDS", 0)
+
+    async def scenario(db):
+        await insert_players(db, "a", "b")
+        game = completed_game("a", "b", (21, 15), datetime.utcnow() - timedelta(minutes=1))
+        await db.games.insert_one(game)
+        await server.run_stat_rollups()
+
+        await server.update_game_score(game["id"], {"score": game["score"], "status": "in_progress"}, None)
+        await server.update_game_score(game["id"], {"score": game["score"], "status": "completed",
+                                                    "winner": "a"}, None)
+        stored = await db.games.find_one({"id": game["id"]})
+        assert abs(stored["actual_end_time"] - game["actual_end_time"]) < timedelta(milliseconds=1)
+
+        await asyncio.sleep(0.01)
+        await server.run_stat_rollups()
+        assert (await career(db, "a"))["games"] == 1
+    run_against_mongo(monkeypatch, scenario)